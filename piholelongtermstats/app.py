@@ -8,28 +8,23 @@ import argparse
 import logging
 import psutil
 import plotly.express as px
-import pandas as pd
 from dash import Dash, dcc, html, Input, Output, State, ctx
 from zoneinfo import ZoneInfo
 import datetime
 
 from piholelongtermstats.db import (
     read_pihole_ftl_db,
+    concat_chunks,
     connect_to_sql,
     probe_sample_df,
-    load_hostname_mapping,
-    load_client_mac_mapping,
-    load_device_activity,
-    load_forwarder_mapping,
+    load_all_mappings,
+    clear_mappings_cache,
     categorize_dns_server,
 )
 from piholelongtermstats.process import (
     regex_ignore_domains,
-    preprocess_df,
+    build_derived_columns,
     prepare_hourly_aggregated_data,
-    resolve_hostnames,
-    process_dns_servers,
-    add_query_type_info,
 )
 from piholelongtermstats.stats import compute_stats
 from piholelongtermstats.plot import (
@@ -135,6 +130,13 @@ parser.add_argument(
     help="Address of the Unbound server (e.g., '127.0.0.1' or 'unbound'). If not set, unbound-control uses the configuration file defaults (e.g., socket). Env: PIHOLE_LT_STATS_UNBOUND_SERVER",
 )
 
+parser.add_argument(
+    "--cache_dir",
+    type=str,
+    default=os.getenv("PIHOLE_LT_STATS_CACHE_DIR", None),
+    help="Directory for a parquet copy of the queries (requires pyarrow), reused until the database file changes. Default: no cache. Env: PIHOLE_LT_STATS_CACHE_DIR",
+)
+
 args = parser.parse_args()
 
 logging.info("Setting environment variables:")
@@ -148,6 +150,7 @@ logging.info(f"PIHOLE_LT_STATS_IGNORE_DOMAINS : {args.ignore_domains}")
 logging.info(f"PIHOLE_LT_STATS_HOSTNAME_DISPLAY : {args.hostname_display}")
 logging.info(f"PIHOLE_LT_STATS_GROUP_BY_MAC : {args.group_by_mac}")
 logging.info(f"PIHOLE_LT_STATS_UNBOUND_SERVER : {args.unbound_server}")
+logging.info(f"PIHOLE_LT_STATS_CACHE_DIR : {args.cache_dir}")
 logging.info("Initializing PiHoleLongTermStats Dashboard")
 
 
@@ -201,7 +204,7 @@ def serve_layout(
 
     start_memory = psutil.virtual_memory().available
 
-    df = pd.concat(
+    df = concat_chunks(
         read_pihole_ftl_db(
             db_paths=db_paths,
             days=days,
@@ -210,8 +213,8 @@ def serve_layout(
             chunksize=chunksize_list,
             timezone=timezone,
             min_date_available=min_date_available,
-        ),
-        ignore_index=True,
+            cache_dir=args.cache_dir,
+        )
     )
 
     logging.info(f"Converted database to a pandas dataframe with {len(df)} rows.")
@@ -230,40 +233,30 @@ def serve_layout(
                 f"Removed domains matching the regex pattern : {pattern}, number of rows in dataframe : {len(df)}"
             )
 
-    # should reduce some memory consumption
-    df["id"] = df["id"].astype("int32")
-    df["type"] = df["type"].astype("int8")
-    df["status"] = df["status"].astype("int8")
-
-    # process timestamps according to timezone
-    df = preprocess_df(df, timezone=timezone)
-
-    # Load hostname mapping from the first database
+    # Load hostname, MAC, forwarder and device activity mappings from the first database
     # (assuming all databases share the same network table)
-    hostname_map = load_hostname_mapping(db_paths[0])
-    
-    # Load MAC mappings for grouping and device activity naming
-    ip_to_mac, mac_to_name = load_client_mac_mapping(db_paths[0])
-
-    # Resolve hostnames based on display mode/grouping
-    df = resolve_hostnames(
-        df, 
-        hostname_map, 
+    mappings = load_all_mappings(db_paths[0])
+
+    # MAC mappings are used for grouping and device activity naming
+    ip_to_mac = mappings["ip_to_mac"]
+    mac_to_name = mappings["mac_to_name"]
+
+    # process timestamps according to timezone, resolve hostnames based on display mode/grouping,
+    # then add DNS server and query type information
+    df = build_derived_columns(
+        df,
+        timezone,
+        mappings["hostname_map"],
+        mappings["forwarder_map"],
+        categorize_dns_server,
         display_mode=hostname_display,
         group_by_mac=group_by_mac,
         ip_to_mac=ip_to_mac,
-        mac_to_name=mac_to_name
+        mac_to_name=mac_to_name,
     )
 
-    # Load DNS forwarder mapping and process DNS server information
-    forwarder_map = load_forwarder_mapping(db_paths[0])
-    df = process_dns_servers(df, forwarder_map, categorize_dns_server)
-    
-    # Process query types
-    df = add_query_type_info(df)
-
-    # Load device activity metrics (Phase 4)
-    device_activity = load_device_activity(db_paths[0])
+    # Device activity metrics (Phase 4)
+    device_activity = mappings["device_activity"]
 
     # compute stats
     stats = compute_stats(
@@ -276,13 +269,16 @@ def serve_layout(
     )
 
     # generate plot data
-    plot_data = generate_plot_data(df, args.n_clients, args.n_domains)
+    plot_data = generate_plot_data(
+        df, args.n_clients, args.n_domains, span_days=stats["data_span_days"]
+    )
 
     ## agregate data
     hourly_data = prepare_hourly_aggregated_data(df, args.n_clients)
 
     callback_data = {
         "hourly_agg": hourly_data["hourly_agg"],
+        "full_time_index": hourly_data["full_time_index"],
         "top_clients": hourly_data["top_clients"],
         "unbound_trend_agg": hourly_data["unbound_trend_agg"],
         "query_type_trend_agg": hourly_data["query_type_trend_agg"],
@@ -1427,6 +1423,10 @@ def reload_page(n_clicks, q1, qw, qm, q3m, qy, qall, start_date, end_date):
     triggered_id = ctx.triggered_id
     logging.info(f"Triggered by: {triggered_id}")
 
+    if triggered_id == "reload-button":
+        # explicit reload, read the network and forwarder tables again
+        clear_mappings_cache()
+
     # Determine date range based on trigger
     if triggered_id.startswith("quick-"):
         # We need the latest timestamp to calculate backwards
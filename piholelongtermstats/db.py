@@ -2,14 +2,35 @@
 ## PiHoleLongTermStats v.0.2.2
 ## License :  MIT
 
+import os
 import sqlite3
+import hashlib
+import functools
+import contextlib
+import numpy as np
 from datetime import datetime, timedelta
 from pathlib import Path
 import psutil
 import pandas as pd
+from pandas.api.types import union_categoricals
 import logging
 from zoneinfo import ZoneInfo
-import gc
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as pa_ds
+    import pyarrow.parquet as pq
+except ImportError:  # optional, only needed for --cache_dir
+    pa = None
+    pa_ds = None
+    pq = None
+
+# rows fetched per cursor.fetchmany() call when loading the network/forwarder tables
+MAPPING_FETCH_SIZE = 5000
+
+# status ids for pihole ftl db, see pi-hole FTL docs
+ALLOWED_STATUSES = [2, 3, 12, 13, 14, 17]
+BLOCKED_STATUSES = [1, 4, 5, 6, 7, 8, 9, 10, 11, 15, 16, 18]
 
 
 ####### reading the database #######
@@ -19,6 +40,15 @@ def connect_to_sql(db_path):
     if Path(db_path).is_file():
         conn = sqlite3.connect(db_path)
         conn.text_factory = lambda b: b.decode(errors="replace")
+        # we only ever read : larger page cache, memory mapped I/O and in-memory temp b-trees
+        conn.executescript(
+            """
+            PRAGMA query_only=1;
+            PRAGMA cache_size=-65536;
+            PRAGMA temp_store=memory;
+            PRAGMA mmap_size=268435456;
+            """
+        )
         logging.info(f"Connected to SQL database at {db_path}")
         return conn
     else:
@@ -40,7 +70,11 @@ def probe_sample_df(conn):
     sample_df["timestamp"] = pd.to_datetime(sample_df["timestamp"], unit="s")
 
     available_memory = psutil.virtual_memory().available
-    memory_per_row = sample_df.memory_usage(deep=True).sum() / len(sample_df)
+    # fixed width columns from their dtypes, strings from a single row, avoids
+    # a deep memory_usage scan over every object in the sample
+    memory_per_row = sum(
+        dtype.itemsize for dtype in sample_df.dtypes if dtype.kind != "O"
+    ) + sample_df.select_dtypes("object").head(1).memory_usage(deep=True, index=False).sum()
     safe_memory = available_memory * 0.5
     chunksize = int(safe_memory / memory_per_row)
     logging.info(f"Calculated chunksize = {chunksize} based on available memory.")
@@ -55,19 +89,12 @@ def probe_sample_df(conn):
     oldest_ts = pd.to_datetime(oldest_ts_raw, unit="s", utc=True)
 
     del sample_df
-    gc.collect()
 
     return chunksize, latest_ts, oldest_ts
 
 
-def load_hostname_mapping(db_path):
-    """Load hostname mapping from network_addresses table
-    
-    Returns a dictionary mapping IP addresses to hostnames.
-    If a hostname is not available, the IP will not be in the mapping.
-    """
-    conn = connect_to_sql(db_path)
-    cursor = conn.cursor()
+def _load_hostname_mapping(conn):
+    """Read the IP-to-hostname mapping using an open connection"""
     
     try:
         # Query to get IP to hostname mapping from network_addresses table
@@ -76,14 +103,9 @@ def load_hostname_mapping(db_path):
         FROM network_addresses 
         WHERE name IS NOT NULL AND name != ''
         """
-        cursor.execute(query)
-        
-        # Create mapping dictionary
         hostname_map = {}
-        for row in cursor.fetchall():
-            ip_address = row[0]
-            hostname = row[1]
-            hostname_map[ip_address] = hostname
+        for batch in pd.read_sql_query(query, conn, chunksize=MAPPING_FETCH_SIZE):
+            hostname_map.update(zip(batch["ip"], batch["name"]))
         
         logging.info(f"Loaded {len(hostname_map)} hostname mappings from network_addresses table")
         
@@ -92,19 +114,39 @@ def load_hostname_mapping(db_path):
         logging.warning("Hostnames will not be available. Falling back to IP addresses.")
         hostname_map = {}
     
-    finally:
-        conn.close()
-    
     return hostname_map
-def load_client_mac_mapping(db_path):
-    """Load IP-to-MAC and MAC-to-Hostname mapping from network table
+
+
+def load_hostname_mapping(db_path):
+    """Load hostname mapping from network_addresses table
     
-    Returns:
-        ip_to_mac: dict mapping IP addresses to MAC addresses
-        mac_to_name: dict mapping MAC addresses to the best available hostname
+    Returns a dictionary mapping IP addresses to hostnames.
+    If a hostname is not available, the IP will not be in the mapping.
     """
     conn = connect_to_sql(db_path)
-    cursor = conn.cursor()
+    try:
+        return _load_hostname_mapping(conn)
+    finally:
+        conn.close()
+
+
+def _preferred_device_names(names_df):
+    """Pick one hostname per MAC address from a (hwaddr, name) dataframe
+
+    The first name seen for a MAC is used, unless a later one starts with an
+    uppercase letter and the first one doesn't. This prefers "Apple-TV" over "apple-tv".
+    """
+    starts_upper = names_df["name"].str[0].str.isupper().fillna(False)
+    return (
+        names_df.assign(starts_upper=starts_upper)
+        .sort_values("starts_upper", ascending=False, kind="stable")
+        .drop_duplicates("hwaddr")
+        .drop(columns="starts_upper")
+    )
+
+
+def _load_client_mac_mapping(conn):
+    """Read the IP-to-MAC and MAC-to-hostname mappings using an open connection"""
     
     ip_to_mac = {}
     mac_to_name = {}
@@ -118,9 +160,8 @@ def load_client_mac_mapping(db_path):
         JOIN network n ON na.network_id = n.id
         WHERE n.hwaddr IS NOT NULL AND n.hwaddr != ''
         """
-        cursor.execute(query_ips)
-        for ip, mac in cursor.fetchall():
-            ip_to_mac[ip] = mac.lower()
+        for batch in pd.read_sql_query(query_ips, conn, chunksize=MAPPING_FETCH_SIZE):
+            ip_to_mac.update(zip(batch["ip"], batch["hwaddr"].str.lower()))
 
         # 2. Get MAC to Hostname mapping
         # We prefer names from network_addresses, then from network table itself if available
@@ -131,39 +172,38 @@ def load_client_mac_mapping(db_path):
         JOIN network n ON na.network_id = n.id
         WHERE na.name IS NOT NULL AND na.name != ''
         """
-        cursor.execute(query_names)
-        for mac, name in cursor.fetchall():
-            m = mac.lower()
-            # If we don't have a name yet for this MAC, use the current one
-            if m not in mac_to_name:
-                mac_to_name[m] = name
-            else:
-                # If we already have a name, but the new one starts with Uppercase and the old one doesn't,
-                # swap it out. This prefers "Apple-TV" over "apple-tv".
-                current_name = mac_to_name[m]
-                if not current_name[0].isupper() and name[0].isupper():
-                     mac_to_name[m] = name
+        # reduce every batch to one name per MAC, then reduce the candidates again
+        candidates = []
+        for batch in pd.read_sql_query(query_names, conn, chunksize=MAPPING_FETCH_SIZE):
+            batch["hwaddr"] = batch["hwaddr"].str.lower()
+            candidates.append(_preferred_device_names(batch))
+        names_df = _preferred_device_names(pd.concat(candidates, ignore_index=True))
+        mac_to_name = dict(zip(names_df["hwaddr"], names_df["name"]))
             
         logging.info(f"Loaded {len(ip_to_mac)} IP-to-MAC mappings and {len(mac_to_name)} MAC-to-Hostname mappings")
         
     except Exception as e:
         logging.warning(f"Could not load MAC mapping: {e}")
         
-    finally:
-        conn.close()
-        
     return ip_to_mac, mac_to_name
 
 
-
-
-def load_forwarder_mapping(db_path):
-    """Load DNS forwarder/server mapping from forward_by_id table
+def load_client_mac_mapping(db_path):
+    """Load IP-to-MAC and MAC-to-Hostname mapping from network table
     
-    Returns a dictionary mapping forwarder IDs to DNS server addresses.
+    Returns:
+        ip_to_mac: dict mapping IP addresses to MAC addresses
+        mac_to_name: dict mapping MAC addresses to the best available hostname
     """
     conn = connect_to_sql(db_path)
-    cursor = conn.cursor()
+    try:
+        return _load_client_mac_mapping(conn)
+    finally:
+        conn.close()
+
+
+def _load_forwarder_mapping(conn):
+    """Read the forwarder mapping using an open connection"""
     
     try:
         # Query to get forwarder ID to DNS server mapping
@@ -171,14 +211,9 @@ def load_forwarder_mapping(db_path):
         SELECT id, forward 
         FROM forward_by_id
         """
-        cursor.execute(query)
-        
-        # Create mapping dictionary
         forwarder_map = {}
-        for row in cursor.fetchall():
-            forwarder_id = row[0]
-            dns_server = row[1]
-            forwarder_map[forwarder_id] = dns_server
+        for batch in pd.read_sql_query(query, conn, chunksize=MAPPING_FETCH_SIZE):
+            forwarder_map.update(zip(batch["id"], batch["forward"]))
         
         logging.info(f"Loaded {len(forwarder_map)} DNS forwarder mappings from forward_by_id table")
         
@@ -187,10 +222,19 @@ def load_forwarder_mapping(db_path):
         logging.warning("DNS server analytics will not be available.")
         forwarder_map = {}
     
+    return forwarder_map
+
+
+def load_forwarder_mapping(db_path):
+    """Load DNS forwarder/server mapping from forward_by_id table
+    
+    Returns a dictionary mapping forwarder IDs to DNS server addresses.
+    """
+    conn = connect_to_sql(db_path)
+    try:
+        return _load_forwarder_mapping(conn)
     finally:
         conn.close()
-    
-    return forwarder_map
 
 
 def categorize_dns_server(forward):
@@ -219,6 +263,36 @@ def categorize_dns_server(forward):
         return forward  # Return as-is for unknown servers
 
 
+def categorize_dns_server_vec(servers):
+    """Vectorized version of categorize_dns_server for a whole column
+    
+    Args:
+        servers: Series of DNS server addresses, NaN for cached/blocked queries
+    
+    Returns:
+        Categorical Series with the category name for every DNS server
+    """
+    servers = servers.astype("string")
+    
+    def contains(pattern):
+        return servers.str.contains(pattern, regex=False, na=False).to_numpy(dtype=bool)
+    
+    conditions = [
+        contains("127.0.0.1#5335"),
+        contains("::1#5335"),
+        contains("192.168.50.1") | contains("fe80::ce28:aaff:fe29:f650"),
+    ]
+    choices = ["Unbound IPv4", "Unbound IPv6", "Router"]
+    
+    # unknown servers are returned as-is
+    categories = np.select(
+        conditions,
+        choices,
+        default=servers.fillna("Cached/Blocked").to_numpy(dtype=object),
+    )
+    return pd.Series(categories, index=servers.index, dtype="category")
+
+
 def get_timestamp_range(days, start_date, end_date, timezone, min_date_available=None):
 
     try:
@@ -266,13 +340,8 @@ def get_timestamp_range(days, start_date, end_date, timezone, min_date_available
     return start_timestamp, end_timestamp
 
 
-def load_device_activity(db_path):
-    """Load device activity metrics from the network table
-    
-    Returns a dictionary mapping MAC addresses to activity metadata.
-    """
-    conn = connect_to_sql(db_path)
-    cursor = conn.cursor()
+def _load_device_activity(conn):
+    """Read device activity metrics using an open connection"""
     
     device_activity = {}
     
@@ -283,26 +352,293 @@ def load_device_activity(db_path):
         FROM network
         WHERE hwaddr IS NOT NULL AND hwaddr != ''
         """
-        cursor.execute(query)
-        
-        for row in cursor.fetchall():
-            mac = row[0].lower()
-            device_activity[mac] = {
-                "first_seen": datetime.fromtimestamp(row[1], tz=ZoneInfo("UTC")) if row[1] else None,
-                "last_query": datetime.fromtimestamp(row[2], tz=ZoneInfo("UTC")) if row[2] else None,
-                "lifetime_queries": row[3],
-                "vendor": row[4] if row[4] else "Unknown"
-            }
+        for batch in pd.read_sql_query(query, conn, chunksize=MAPPING_FETCH_SIZE):
+            batch["hwaddr"] = batch["hwaddr"].str.lower()
+
+            # 0/NULL timestamps mean the device was never seen
+            for col, src in (("first_seen", "firstSeen"), ("last_query", "lastQuery")):
+                seen = pd.to_datetime(batch[src].where(batch[src] > 0), unit="s", utc=True)
+                batch[col] = seen.astype(object).where(seen.notna(), None)
+
+            batch["lifetime_queries"] = batch["numQueries"]
+            batch["vendor"] = batch["macVendor"].where(
+                batch["macVendor"].fillna("") != "", "Unknown"
+            )
+
+            device_activity.update(
+                batch.drop_duplicates("hwaddr", keep="last")
+                .set_index("hwaddr")[["first_seen", "last_query", "lifetime_queries", "vendor"]]
+                .to_dict(orient="index")
+            )
             
         logging.info(f"Loaded activity metrics for {len(device_activity)} devices from network table")
         
     except Exception as e:
         logging.warning(f"Could not load device activity: {e}")
+        
+    return device_activity
+
+
+def load_device_activity(db_path):
+    """Load device activity metrics from the network table
     
+    Returns a dictionary mapping MAC addresses to activity metadata.
+    """
+    conn = connect_to_sql(db_path)
+    try:
+        return _load_device_activity(conn)
     finally:
         conn.close()
-        
-    return device_activity
+
+
+@functools.lru_cache(maxsize=8)
+def _load_all_mappings_cached(db_path, mtime):
+    """Mappings of a database file, cached for as long as its modification time stays the same"""
+    conn = connect_to_sql(db_path)
+    try:
+        hostname_map = _load_hostname_mapping(conn)
+        ip_to_mac, mac_to_name = _load_client_mac_mapping(conn)
+        forwarder_map = _load_forwarder_mapping(conn)
+        device_activity = _load_device_activity(conn)
+    finally:
+        conn.close()
+
+    return {
+        "hostname_map": hostname_map,
+        "ip_to_mac": ip_to_mac,
+        "mac_to_name": mac_to_name,
+        "forwarder_map": forwarder_map,
+        "device_activity": device_activity,
+    }
+
+
+def load_all_mappings(db_path):
+    """Load hostname, MAC, forwarder and device activity data over a single connection
+
+    Returns a dictionary with the keys hostname_map, ip_to_mac, mac_to_name,
+    forwarder_map and device_activity, holding the same values as the individual
+    load_* functions. Results are reused until the database file is modified or
+    clear_mappings_cache is called, the returned mappings must not be modified.
+    """
+    return dict(_load_all_mappings_cached(db_path, os.path.getmtime(db_path)))
+
+
+def clear_mappings_cache():
+    """Forget the mappings cached by load_all_mappings"""
+    _load_all_mappings_cached.cache_clear()
+
+
+QUERY_COLUMNS = """
+    SELECT qs.id, qs.timestamp, qs.type, qs.status, d.domain, c.ip as client, qs.reply_time, qs.forward
+    FROM query_storage qs
+    JOIN client_by_id c ON qs.client = c.id
+    JOIN domain_by_id d ON qs.domain = d.id
+"""
+
+# fixed schema so every chunk is written with the same column types, matches QUERY_DTYPES
+# except for id, which is stored as int64 so that every id fits. timestamp is stored as
+# int64 unless the database has float timestamps, see _cache_schema
+if pa is not None:
+    CACHE_SCHEMA = pa.schema(
+        [
+            ("id", pa.int64()),
+            ("timestamp", pa.int64()),
+            ("type", pa.int16()),
+            ("status", pa.int8()),
+            ("domain", pa.dictionary(pa.int32(), pa.string())),
+            ("client", pa.string()),
+            ("reply_time", pa.float32()),
+            ("forward", pa.int32()),
+        ]
+    )
+
+
+# smallest dtypes that hold the query columns, timestamp keeps the type stored in the database.
+# few unique domains repeated over many rows are stored as codes, forwarder ids can be NULL
+# and are kept as a nullable integer so chunks concatenate without unifying per chunk categories
+QUERY_DTYPES = {
+    "id": "int32",
+    # FTL stores types without an own id as 100 + the RR type, e.g. 357 for CAA
+    "type": "int16",
+    "status": "int8",
+    "domain": "category",
+    "client": "object",
+    "reply_time": "float32",
+    "forward": "Int32",
+}
+
+
+# text columns of the query join
+TEXT_COLUMNS = ("domain", "client")
+
+
+def _downcast_chunk(chunk):
+    """Store the query columns with the smallest dtypes that hold their values
+
+    Integer columns with a value outside of the range of their QUERY_DTYPES dtype
+    (e.g. ids above int32) keep their wider dtype instead of wrapping around.
+    """
+    dtypes = {}
+    for col, dtype in QUERY_DTYPES.items():
+        if col not in chunk or chunk[col].dtype == dtype:
+            continue
+        target = pd.api.types.pandas_dtype(dtype)
+        if pd.api.types.is_integer_dtype(target):
+            info = np.iinfo(getattr(target, "numpy_dtype", target))
+            low, high = chunk[col].min(), chunk[col].max()
+            if not pd.isna(low) and (low < info.min or high > info.max):
+                continue
+        dtypes[col] = dtype
+    return chunk.astype(dtypes)
+
+
+def _decode_text_column(values, dtype):
+    """Decode a column of raw bytes by decoding each distinct value once
+
+    Invalid UTF-8 is replaced like the text_factory of connect_to_sql does. NULLs stay missing.
+    """
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    # different byte strings can decode to the same replaced text, keep categories unique
+    decoded_codes, decoded = pd.factorize(
+        np.array([b.decode(errors="replace") for b in uniques], dtype=object)
+    )
+    # code -1 (NULL) picks the appended -1
+    column = pd.Categorical.from_codes(np.append(decoded_codes, -1)[codes], categories=decoded)
+    return pd.Series(column if dtype == "category" else column.astype(object), dtype=dtype)
+
+
+@contextlib.contextmanager
+def _bytes_text_factory(conn):
+    """Fetch text as bytes on conn while the block runs, then restore its text_factory"""
+    text_factory = conn.text_factory
+    conn.text_factory = bytes
+    try:
+        yield
+    finally:
+        conn.text_factory = text_factory
+
+
+def _fetch_query_chunks(conn, query, params, chunksize):
+    """Yield the rows of a query on the query join as dataframes of chunksize rows
+
+    Columns are built from the cursor.fetchmany rows without the record array of
+    pd.read_sql_query and then downcast with _downcast_chunk. Text is fetched as bytes
+    and only the distinct values of a chunk are decoded. Like read_sql_query, a single
+    empty dataframe is yielded when the query returns no rows.
+
+    conn only fetches bytes during execute/fetchmany, never while a chunk is yielded,
+    so other users of conn are unaffected, also when the generator is not exhausted.
+    """
+    with _bytes_text_factory(conn):
+        cursor = conn.execute(query, params)
+    cursor.arraysize = chunksize
+    columns = [col[0] for col in cursor.description]
+
+    has_rows = False
+    while True:
+        with _bytes_text_factory(conn):
+            rows = cursor.fetchmany()
+        if not rows:
+            break
+        has_rows = True
+        yield _downcast_chunk(
+            pd.DataFrame(
+                {
+                    col: _decode_text_column(values, QUERY_DTYPES[col])
+                    if col in TEXT_COLUMNS
+                    else pd.Series(values)
+                    for col, values in zip(columns, zip(*rows))
+                }
+            )
+        )
+
+    if not has_rows:
+        yield pd.DataFrame({col: pd.Series(dtype=QUERY_DTYPES.get(col, "int64")) for col in columns})
+
+
+def _parquet_cache_path(db_path, cache_dir):
+    """Path of the parquet cache file for a database inside cache_dir"""
+
+    resolved = str(Path(db_path).resolve())
+    digest = hashlib.sha1(resolved.encode()).hexdigest()[:12]
+    return Path(cache_dir) / f"{Path(db_path).stem}-{digest}.parquet"
+
+
+def _is_cache_fresh(cache_path, db_path):
+    """The cache is valid as long as the database was not modified after it was written"""
+
+    return cache_path.is_file() and os.path.getmtime(cache_path) >= os.path.getmtime(db_path)
+
+
+# cache path -> database mtime of the caches that could not be written, these are not
+# rebuilt on every page load but only again once the database is modified
+_FAILED_CACHES = {}
+
+
+def _cache_schema(conn):
+    """Parquet cache schema for a database, timestamp keeps the type stored in the database"""
+
+    has_float_timestamps = conn.execute(
+        "SELECT 1 FROM query_storage WHERE typeof(timestamp) = 'real' LIMIT 1"
+    ).fetchone()
+    if has_float_timestamps:
+        return CACHE_SCHEMA.set(
+            CACHE_SCHEMA.get_field_index("timestamp"), pa.field("timestamp", pa.float64())
+        )
+    return CACHE_SCHEMA
+
+
+def _write_parquet_cache(conn, cache_path, chunksize):
+    """Dump all rows of the query join to a parquet file, one row group per chunk"""
+
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix(".parquet.tmp")
+
+    try:
+        schema = _cache_schema(conn)
+        with pq.ParquetWriter(
+            tmp_path, schema, compression="zstd", compression_level=3
+        ) as writer:
+            for chunk in _fetch_query_chunks(
+                conn, QUERY_COLUMNS + "ORDER BY qs.timestamp;", (), chunksize
+            ):
+                writer.write_table(
+                    pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+                )
+        # only replace the cache once it has been written completely
+        os.replace(tmp_path, cache_path)
+        logging.info(f"Wrote parquet cache to {cache_path}")
+        return True
+    except Exception as e:
+        logging.warning(f"Could not write parquet cache {cache_path}: {e}")
+        tmp_path.unlink(missing_ok=True)
+        return False
+
+
+def _read_parquet_cache(cache_path, start_timestamp, end_timestamp, chunksize):
+    """Yield the rows within the timestamp range from a parquet cache file
+
+    Rows were written in timestamp order, so row groups outside of the range are
+    skipped using the row group statistics. Like _fetch_query_chunks, rows are yielded
+    in dataframes of at most chunksize rows and a single empty dataframe is yielded
+    when no row is in the range.
+    """
+
+    dataset = pa_ds.dataset(cache_path, format="parquet")
+    in_range = (pa_ds.field("timestamp") >= start_timestamp) & (pa_ds.field("timestamp") < end_timestamp)
+
+    has_rows = False
+    for batch in dataset.to_batches(filter=in_range, batch_size=chunksize):
+        if batch.num_rows == 0:
+            continue
+        has_rows = True
+        chunk = batch.to_pandas()
+        # the dictionary holds the domains of all row groups
+        chunk["domain"] = chunk["domain"].cat.remove_unused_categories()
+        yield _downcast_chunk(chunk)
+
+    if not has_rows:
+        yield _downcast_chunk(dataset.schema.empty_table().to_pandas())
 
 
 def read_pihole_ftl_db(
@@ -313,8 +649,14 @@ def read_pihole_ftl_db(
     chunksize=None,
     timezone="UTC",
     min_date_available=None,
+    cache_dir=None,
 ):
-    """Read the PiHole FTL database"""
+    """Read the PiHole FTL database
+
+    If cache_dir is given (requires pyarrow), the queries of each database are
+    dumped once to a parquet file in cache_dir and read from there until the
+    database file is modified.
+    """
 
     start_timestamp, end_timestamp = get_timestamp_range(
         days, start_date, end_date, timezone, min_date_available
@@ -324,22 +666,51 @@ def read_pihole_ftl_db(
         f"Reading data from PiHole-FTL database(s) for timestamps ranging from {start_timestamp} to {end_timestamp} (TZ: UTC)..."
     )
 
-    query = f"""
-    SELECT qs.id, qs.timestamp, qs.type, qs.status, d.domain, c.ip as client, qs.reply_time, qs.forward
-    FROM query_storage qs
-    JOIN client_by_id c ON qs.client = c.id
-    JOIN domain_by_id d ON qs.domain = d.id
-    WHERE qs.timestamp >= {start_timestamp} AND qs.timestamp < {end_timestamp};
-    """
+    if cache_dir and pq is None:
+        logging.warning("pyarrow is not installed, parquet cache disabled. Install with : pip install piholelongtermstats[cache]")
+        cache_dir = None
+
+    query = QUERY_COLUMNS + "WHERE qs.timestamp >= ? AND qs.timestamp < ?;"
 
     for db_idx, db_path in enumerate(db_paths):
         logging.info(
             f"Processing database {db_idx + 1}/{len(db_paths)} at {db_path}..."
         )
+
+        if cache_dir:
+            cache_path = _parquet_cache_path(db_path, cache_dir)
+            db_mtime = os.path.getmtime(db_path)
+            if _FAILED_CACHES.get(str(cache_path)) == db_mtime:
+                logging.info(f"Parquet cache {cache_path} could not be written for this database, reading from the database...")
+            elif not _is_cache_fresh(cache_path, db_path):
+                logging.info(f"Parquet cache {cache_path} is missing or outdated, rebuilding...")
+                conn = connect_to_sql(db_path)
+                try:
+                    if _write_parquet_cache(conn, cache_path, chunksize[db_idx]):
+                        _FAILED_CACHES.pop(str(cache_path), None)
+                    else:
+                        _FAILED_CACHES[str(cache_path)] = db_mtime
+                finally:
+                    conn.close()
+            if _is_cache_fresh(cache_path, db_path):
+                logging.info(f"Reading database {db_idx + 1} from parquet cache {cache_path}...")
+                chunk_num = 0
+                for chunk in _read_parquet_cache(
+                    cache_path, start_timestamp, end_timestamp, chunksize[db_idx]
+                ):
+                    chunk_num += 1
+                    logging.info(
+                        f"Processing parquet cache chunk {chunk_num} from database {db_idx + 1} at {db_path}..."
+                    )
+                    yield chunk
+                continue
+
         conn = connect_to_sql(db_path)
 
         chunk_num = 0
-        for chunk in pd.read_sql_query(query, conn, chunksize=chunksize[db_idx]):
+        for chunk in _fetch_query_chunks(
+            conn, query, (start_timestamp, end_timestamp), chunksize[db_idx]
+        ):
             chunk_num += 1
             logging.info(
                 f"Processing dataframe chunk {chunk_num} from database {db_idx + 1} at {db_path}..."
@@ -347,3 +718,161 @@ def read_pihole_ftl_db(
             yield chunk
 
         conn.close()
+
+
+def concat_chunks(chunks):
+    """Concatenate dataframe chunks from read_pihole_ftl_db into one dataframe
+
+    pd.concat falls back to object dtype when categorical columns have different
+    categories in each chunk, so these columns are combined with union_categoricals.
+    """
+    chunks = list(chunks)
+    cat_cols = chunks[0].select_dtypes("category").columns
+
+    df = pd.concat([chunk.drop(columns=cat_cols) for chunk in chunks], ignore_index=True)
+    for col in cat_cols:
+        df.insert(
+            chunks[0].columns.get_loc(col),
+            col,
+            union_categoricals([chunk[col] for chunk in chunks], sort_categories=True),
+        )
+
+    return df
+
+
+def read_pihole_ftl_aggregates(
+    db_paths,
+    days=31,
+    start_date=None,
+    end_date=None,
+    timezone="UTC",
+    min_date_available=None,
+    n_clients=10,
+    n_domains=10,
+):
+    """Read pre-aggregated query counts from the PiHole FTL database(s)
+
+    Counting happens in SQLite so that only the plotted shapes are fetched instead
+    of every query row. Returns a dictionary with the keys :
+        top_clients : client ip and count of the n_clients busiest clients
+        top_allowed_domains, top_blocked_domains : domain and count of the n_domains
+            most queried allowed/blocked domains
+        day_hour_counts : query counts indexed by (day_name, hour) with one column per status_type
+        dns_categories : query count per DNS server category
+
+    Clients are not resolved to hostnames and domains are not shortened.
+    Use read_pihole_ftl_db when row level data is needed (e.g. the scatter plot).
+    """
+
+    start_timestamp, end_timestamp = get_timestamp_range(
+        days, start_date, end_date, timezone, min_date_available
+    )
+
+    try:
+        tz = ZoneInfo(timezone)
+    except Exception:
+        tz = ZoneInfo("UTC")
+
+    logging.info(
+        f"Reading aggregated data from PiHole-FTL database(s) for timestamps ranging from {start_timestamp} to {end_timestamp} (TZ: UTC)..."
+    )
+
+    # top-N of a single database can be cut in SQL, several databases have to be summed first
+    limit = "LIMIT :n" if len(db_paths) == 1 else ""
+    status_case = f"""
+        CASE WHEN qs.status IN ({", ".join(map(str, ALLOWED_STATUSES))}) THEN 'Allowed'
+             WHEN qs.status IN ({", ".join(map(str, BLOCKED_STATUSES))}) THEN 'Blocked'
+             ELSE 'Other' END
+    """
+    where = "WHERE qs.timestamp >= :start AND qs.timestamp < :end"
+
+    queries = {
+        "top_clients": f"""
+            SELECT c.ip AS client, COUNT(*) AS count
+            FROM query_storage qs
+            JOIN client_by_id c ON qs.client = c.id
+            {where}
+            GROUP BY c.ip ORDER BY count DESC {limit};
+        """,
+        "top_allowed_domains": f"""
+            SELECT d.domain AS domain, COUNT(*) AS count
+            FROM query_storage qs
+            JOIN domain_by_id d ON qs.domain = d.id
+            {where} AND qs.status IN ({", ".join(map(str, ALLOWED_STATUSES))})
+            GROUP BY d.domain ORDER BY count DESC {limit};
+        """,
+        "top_blocked_domains": f"""
+            SELECT d.domain AS domain, COUNT(*) AS count
+            FROM query_storage qs
+            JOIN domain_by_id d ON qs.domain = d.id
+            {where} AND qs.status IN ({", ".join(map(str, BLOCKED_STATUSES))})
+            GROUP BY d.domain ORDER BY count DESC {limit};
+        """,
+        # 15 minute buckets, every timezone offset is a multiple of 15 minutes so
+        # day and hour can be derived in local time afterwards. The cast floors REAL timestamps too
+        "day_hour_counts": f"""
+            SELECT CAST(qs.timestamp AS INTEGER) / 900 * 900 AS bucket, {status_case} AS status_type, COUNT(*) AS count
+            FROM query_storage qs
+            {where}
+            GROUP BY bucket, status_type;
+        """,
+        "dns_categories": f"""
+            SELECT qs.forward AS forward, COUNT(*) AS count
+            FROM query_storage qs
+            {where}
+            GROUP BY qs.forward;
+        """,
+    }
+    params = {"start": start_timestamp, "end": end_timestamp, "n": max(n_clients, n_domains)}
+
+    results = {key: [] for key in queries}
+    for db_idx, db_path in enumerate(db_paths):
+        logging.info(
+            f"Aggregating database {db_idx + 1}/{len(db_paths)} at {db_path}..."
+        )
+        conn = connect_to_sql(db_path)
+        try:
+            for key, query in queries.items():
+                results[key].append(pd.read_sql_query(query, conn, params=params))
+            # forwarder ids are only valid within their own database
+            forwards = results["dns_categories"][-1]
+            forwards["forward"] = forwards["forward"].map(_load_forwarder_mapping(conn))
+        finally:
+            conn.close()
+
+    def total(key, by):
+        return pd.concat(results[key], ignore_index=True).groupby(by, sort=False)["count"].sum()
+
+    top_clients = total("top_clients", "client").nlargest(n_clients).reset_index()
+    top_allowed_domains = total("top_allowed_domains", "domain").nlargest(n_domains).reset_index()
+    top_blocked_domains = total("top_blocked_domains", "domain").nlargest(n_domains).reset_index()
+
+    buckets = pd.concat(results["day_hour_counts"], ignore_index=True)
+    local_time = pd.to_datetime(buckets["bucket"], unit="s", utc=True).dt.tz_convert(tz)
+    day_hour_counts = (
+        buckets.groupby(
+            [local_time.dt.day_name().rename("day_name"), local_time.dt.hour.rename("hour"), "status_type"]
+        )["count"]
+        .sum()
+        .unstack("status_type", fill_value=0)
+    )
+
+    forwards = pd.concat(results["dns_categories"], ignore_index=True)
+    dns_categories = (
+        forwards["count"]
+        .groupby(categorize_dns_server_vec(forwards["forward"]), observed=True)
+        .sum()
+        .sort_values(ascending=False)
+    )
+
+    logging.info(
+        f"Aggregated {buckets['count'].sum()} queries into {len(buckets)} time buckets."
+    )
+
+    return {
+        "top_clients": top_clients,
+        "top_allowed_domains": top_allowed_domains,
+        "top_blocked_domains": top_blocked_domains,
+        "day_hour_counts": day_hour_counts,
+        "dns_categories": dns_categories,
+    }
@@ -3,33 +3,78 @@
 ## License :  MIT
 
 import logging
+import numpy as np
 import pandas as pd
-import gc
 import plotly.express as px
 import itertools
 
 
-def generate_plot_data(df, n_clients, n_domains):
-    """Generate plot data"""
+def _shorten_domains(domains):
+    """Shorten domain names longer than 45 characters to their first and last 20 characters"""
+    domains = domains.astype(object)
+    return domains.where(
+        domains.str.len() <= 45,
+        domains.str.slice(0, 20) + "..." + domains.str.slice(-20),
+    )
+
+
+def _shorten_domain_categories(domains):
+    """Shorten a categorical domain column by shortening its categories instead of every row
+
+    Different long domains can have the same shortened name, these are merged into one category.
+    """
+    domains = domains.cat.remove_unused_categories()
+    short_codes, short_names = pd.factorize(_shorten_domains(domains.cat.categories))
+    codes = domains.cat.codes.to_numpy()
+    return pd.Series(
+        pd.Categorical.from_codes(
+            np.where(codes >= 0, short_codes[codes], -1), categories=short_names
+        ),
+        index=domains.index,
+        name=domains.name,
+    )
+
+
+def _top_domains(domains, n_domains):
+    """Count domains and return the n_domains most frequent ones with shortened names"""
+    # value_counts on the categorical domain column also lists unused domains
+    counts = domains.value_counts()
+    counts = counts[counts > 0]
+
+    # shorten the names of the counted domains only, not of every row
+    counts.index = _shorten_domains(counts.index)
+    top_df = counts.groupby(level=0, sort=False).sum().nlargest(n_domains).reset_index()
+    top_df.columns = ["Domain", "count"]
+
+    return top_df
+
+
+def generate_plot_data(df, n_clients, n_domains, span_days=None):
+    """Generate plot data
+
+    span_days is the number of days covered by df, computed from its timestamps if not given.
+    """
 
     logging.info("Generating plot data...")
 
-    def shorten(s):
-        return s if len(s) <= 45 else f"{s[:20]}...{s[-20:]}"
+    # counted once, used for the top clients plot and the scatter
+    client_counts = df["client"].value_counts()
+    domain_counts = df["domain"].value_counts()
 
-    top_clients = df["client"].value_counts().nlargest(n_clients).index
+    top_clients = client_counts.nlargest(n_clients).index
+    # only copy the grouped columns of the selected rows, not the whole frame
     top_clients_stacked = (
-        df[df["client"].isin(top_clients)]
-        .groupby(["client", "status_type"])
+        df.loc[df["client"].isin(top_clients), ["client", "status_type"]]
+        .groupby(["client", "status_type"], observed=True)
         .size()
         .reset_index(name="count")
     )
     top_clients_stacked["client"] = pd.Categorical(
         top_clients_stacked["client"],
-        categories=top_clients_stacked.groupby("client")["count"]
+        categories=top_clients_stacked.groupby("client", observed=True)["count"]
         .sum()
         .sort_values(ascending=False)
-        .index,
+        .index.tolist(),
         ordered=True,
     )
     top_clients_stacked = top_clients_stacked.sort_values(
@@ -38,34 +83,16 @@ def generate_plot_data(df, n_clients, n_domains):
     logging.info("Generated plot data for top clients.")
 
     # plot data for allowed and blocked domains
-    tmp_blocked = df[df["status_type"] == "Blocked"].copy()
-    tmp_blocked["domain"] = tmp_blocked["domain"].apply(shorten)
-
-    blocked_df = (
-        tmp_blocked["domain"]
-        .value_counts()
-        .nlargest(n_domains)
-        .reset_index()
-    )
-    blocked_df.columns = ["Domain", "count"]
-
-    tmp_allowed = df[df["status_type"] == "Allowed"].copy()
-    tmp_allowed["domain"] = tmp_allowed["domain"].apply(shorten)
-
-    allowed_df = (
-        tmp_allowed["domain"]
-        .value_counts()
-        .nlargest(n_domains)
-        .reset_index()
-    )
-    allowed_df.columns = ["Domain", "count"]
+    blocked_df = _top_domains(df.loc[df["status_type"] == "Blocked", "domain"], n_domains)
+    allowed_df = _top_domains(df.loc[df["status_type"] == "Allowed", "domain"], n_domains)
 
     logging.info("Generated plot data for allowed and blocked domains.")
 
     # plot data for reply time
     # Smart Aggregation: If data spans 3 days or less, show Hourly averages. Otherwise, Daily.
-    time_diff = df["timestamp"].max() - df["timestamp"].min()
-    data_span_days = time_diff.days
+    if span_days is None:
+        span_days = (df["timestamp"].max() - df["timestamp"].min()).days
+    data_span_days = span_days
     
     if data_span_days <= 3:
         granularity = "Hourly"
@@ -90,58 +117,42 @@ def generate_plot_data(df, n_clients, n_domains):
     client_list = df["client"].unique().tolist()
 
     # plot data for doman-client scatter. take minimum from n_domains or n_clients
-    top_clients = df["client"].value_counts().nlargest(min(n_domains, n_clients)).index
-    top_domains = df["domain"].value_counts().nlargest(min(n_domains, n_clients)).index
-
-    df_top = df.loc[
-        df["client"].isin(top_clients) & df["domain"].isin(top_domains)
-    ].copy()
-    df_top.loc[:, "domain"] = df_top["domain"].apply(shorten)
+    top_clients = client_counts.nlargest(min(n_domains, n_clients)).index
+    top_domains = domain_counts.nlargest(min(n_domains, n_clients)).index
 
+    # count on the raw domains first, then shorten the names of the few counted rows.
+    # long domains that shorten to the same name are summed in the second groupby
     client_domain_scatter_df = (
-        df_top.groupby(["client", "domain", "status_type"])
+        df.loc[
+            df["client"].isin(top_clients) & df["domain"].isin(top_domains),
+            ["client", "domain", "status_type"],
+        ]
+        .groupby(["client", "domain", "status_type"], observed=True)
         .size()
         .reset_index(name="count")
-        .sort_values(by="count")
     )
-
-    # heatmap
-    order = [
-        "Monday",
-        "Tuesday",
-        "Wednesday",
-        "Thursday",
-        "Friday",
-        "Saturday",
-        "Sunday",
-    ]
-
-    day_hour_heatmap = (
-        df.groupby(["day_name", "hour"])
-        .size()
-        .reset_index(name="count")
-        .pivot(index="day_name", columns="hour", values="count")
-        .fillna(0)
-        .reindex(order)
+    client_domain_scatter_df["domain"] = _shorten_domain_categories(
+        client_domain_scatter_df["domain"]
     )
-
-    blocked_day_hour_heatmap = (
-        tmp_blocked.groupby(["day_name", "hour"])
-        .size()
-        .reset_index(name="count")
-        .pivot(index="day_name", columns="hour", values="count")
-        .fillna(0)
-        .reindex(order)
+    client_domain_scatter_df = (
+        client_domain_scatter_df.groupby(["client", "domain", "status_type"], observed=True)["count"]
+        .sum()
+        .reset_index()
+        .sort_values(by="count")
     )
 
-    allowed_day_hour_heatmap = (
-        tmp_allowed.groupby(["day_name", "hour"])
+    # heatmap
+    # a single pass over df for all three heatmaps, split by status afterwards.
+    # day_name is an ordered categorical, observed=False keeps every day in week order
+    day_hour_counts = (
+        df.groupby(["day_name", "hour", "status_type"], observed=False)
         .size()
-        .reset_index(name="count")
-        .pivot(index="day_name", columns="hour", values="count")
-        .fillna(0)
-        .reindex(order)
+        .unstack("status_type", fill_value=0)
+        .reindex(columns=["Allowed", "Blocked", "Other"], fill_value=0)
     )
+    day_hour_heatmap = day_hour_counts.sum(axis=1).unstack("hour", fill_value=0)
+    blocked_day_hour_heatmap = day_hour_counts["Blocked"].unstack("hour", fill_value=0)
+    allowed_day_hour_heatmap = day_hour_counts["Allowed"].unstack("hour", fill_value=0)
 
     # plot data for DNS server distribution
     dns_server_df = (
@@ -159,8 +170,7 @@ def generate_plot_data(df, n_clients, n_domains):
     )
     query_type_df.columns = ["Query Type", "count"]
 
-    del df_top, top_clients, top_domains, tmp_allowed, tmp_blocked
-    gc.collect()
+    del top_clients, top_domains, day_hour_counts, client_counts, domain_counts
 
     logging.info("Plot data generation complete")
 
@@ -181,7 +191,19 @@ def generate_plot_data(df, n_clients, n_domains):
     }
 
 
+def _hours_between(callback_data, timestamps):
+    """Hourly index from the first to the last of timestamps, sliced from the cached full_time_index"""
+    full_time_index = callback_data["full_time_index"]
+    return full_time_index[full_time_index.slice_indexer(timestamps.min(), timestamps.max())]
+
+
 def generate_queries_over_time(callback_data, client=None):
+    # the frame for all clients is the same on every call, build it once
+    if client is None and "queries_over_time_all" in callback_data:
+        dff_grouped = callback_data["queries_over_time_all"]
+        title_text = "DNS Queries Over Time for All Clients"
+        return _plot_queries_over_time(dff_grouped, title_text)
+
     dff_grouped = callback_data["hourly_agg"]
 
     if client is not None:
@@ -190,7 +212,7 @@ def generate_queries_over_time(callback_data, client=None):
         title_text = f"DNS Queries Over Time for {client}"
     else:
         dff_grouped = (
-            dff_grouped.groupby(["timestamp", "status_type"])["count"]
+            dff_grouped.groupby(["timestamp", "status_type"], observed=True)["count"]
             .sum()
             .reset_index()
         )
@@ -220,15 +242,13 @@ def generate_queries_over_time(callback_data, client=None):
         return fig
 
     # Fill missing data with 0
-    all_times = pd.date_range(
-        dff_grouped["timestamp"].min(), dff_grouped["timestamp"].max(), freq="h"
-    )
+    all_times = _hours_between(callback_data, dff_grouped["timestamp"])
     status_types = ["Other", "Allowed", "Blocked"]
     full_index = pd.MultiIndex.from_product(
         [all_times, status_types], names=["timestamp", "status_type"]
     )
     dff_grouped = (
-        dff_grouped.set_index(["timestamp", "status_type"])
+        dff_grouped.set_index(["timestamp", "status_type"])["count"]
         .reindex(full_index, fill_value=0)
         .reset_index()
     )
@@ -237,6 +257,13 @@ def generate_queries_over_time(callback_data, client=None):
     )
     dff_grouped = dff_grouped.sort_values("status_type")
 
+    if client is None:
+        callback_data["queries_over_time_all"] = dff_grouped
+
+    return _plot_queries_over_time(dff_grouped, title_text)
+
+
+def _plot_queries_over_time(dff_grouped, title_text):
     fig = px.area(
         dff_grouped,
         x="timestamp",
@@ -268,9 +295,6 @@ def generate_queries_over_time(callback_data, client=None):
         legend=dict(orientation="h", yanchor="top", y=-0.4, xanchor="center", x=0.5)
     )
 
-    del dff_grouped
-    gc.collect()
-
     return fig
 
 
@@ -282,14 +306,14 @@ def generate_client_activity_over_time(callback_data, n_clients, client=None):
         logging.info(f"Selected client : {client}")
         dff_grouped = dff_grouped[dff_grouped["client"] == client]
         dff_grouped = (
-            dff_grouped.groupby(["timestamp", "client"])["count"].sum().reset_index()
+            dff_grouped.groupby(["timestamp", "client"], observed=True)["count"].sum().reset_index()
         )
         title_text = f"Activity for {client}"
         clients_to_show = [client]
     else:
         dff_grouped = dff_grouped[dff_grouped["client"].isin(top_clients)]
         dff_grouped = (
-            dff_grouped.groupby(["timestamp", "client"])["count"].sum().reset_index()
+            dff_grouped.groupby(["timestamp", "client"], observed=True)["count"].sum().reset_index()
         )
         title_text = f"Activity for top {n_clients} clients"
         clients_to_show = top_clients
@@ -317,9 +341,7 @@ def generate_client_activity_over_time(callback_data, n_clients, client=None):
         )
         return fig
 
-    all_times = pd.date_range(
-        dff_grouped["timestamp"].min(), dff_grouped["timestamp"].max(), freq="h"
-    )
+    all_times = _hours_between(callback_data, dff_grouped["timestamp"])
     full_index = pd.MultiIndex.from_product(
         [all_times, clients_to_show], names=["timestamp", "client"]
     )
@@ -366,7 +388,7 @@ def generate_dns_server_pie(callback_data, client=None):
         return px.pie(title="No DNS Server Data")
 
     # Sum counts by category
-    df_sum = df.groupby("dns_category")["count"].sum().reset_index()
+    df_sum = df.groupby("dns_category", observed=True)["count"].sum().reset_index()
     df_sum.columns = ["DNS Server", "count"]
 
     fig = px.pie(
@@ -403,7 +425,7 @@ def generate_query_type_pie(callback_data, client=None):
         return px.pie(title="No Query Type Data")
 
     # Sum counts by category
-    df_sum = df.groupby("query_type")["count"].sum().reset_index()
+    df_sum = df.groupby("query_type", observed=True)["count"].sum().reset_index()
     df_sum.columns = ["Query Type", "count"]
 
     fig = px.pie(
@@ -435,7 +457,7 @@ def generate_unbound_usage_over_time(callback_data, client=None):
         return px.area(title="No Unbound Usage Data Over Time", template="plotly_white")
 
     # Aggregate by timestamp and category (in case multiple clients are selected or global view)
-    df_grouped = df.groupby(["timestamp", "dns_category"])["count"].sum().reset_index()
+    df_grouped = df.groupby(["timestamp", "dns_category"], observed=True)["count"].sum().reset_index()
 
     fig = px.area(
         df_grouped,
@@ -5,8 +5,22 @@
 import re
 import logging
 from zoneinfo import ZoneInfo
+import numpy as np
 import pandas as pd
 
+from piholelongtermstats.db import ALLOWED_STATUSES, BLOCKED_STATUSES
+
+
+# day names in week order, day_name is stored as an ordered categorical of these
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+# status_type categories and a lookup table from status id to category code
+STATUS_TYPES = ["Allowed", "Blocked", "Other"]
+STATUS_TYPE_CODES = np.full(256, STATUS_TYPES.index("Other"), dtype=np.int8)
+STATUS_TYPE_CODES[ALLOWED_STATUSES] = STATUS_TYPES.index("Allowed")
+STATUS_TYPE_CODES[BLOCKED_STATUSES] = STATUS_TYPES.index("Blocked")
+
 
 def _is_valid_regex(pattern):
     try:
@@ -16,9 +30,47 @@ def _is_valid_regex(pattern):
         return False
 
 
+def _pattern_literal(pattern):
+    """The text pattern matches literally, e.g. "ads.example.com" when the dots are escaped
+
+    Returns None unless escaping the unescaped pattern gives back exactly the pattern,
+    which only relies on the public re.escape and not on the regex parser.
+    """
+    literal = re.sub(r"\\(\W)", r"\1", pattern)
+    return literal if re.escape(literal) == pattern else None
+
+
+def _pattern_literals(pattern):
+    """The texts an alternation of literal domains matches literally, or None
+
+    Every "|" separated branch has to be a literal (see _pattern_literal). An escaped "|"
+    leaves a trailing backslash in its branch, which is then not a literal.
+    """
+    literals = [_pattern_literal(branch) for branch in pattern.split("|")]
+    return None if None in literals else literals
+
+
+def _domains_matching(domains, pattern):
+    """Boolean mask of domains containing a match of pattern, same as str.contains(pattern)"""
+    literals = _pattern_literals(pattern)
+    if literals is None:
+        return domains.str.contains(pattern, regex=True, na=False).to_numpy(dtype=bool)
+    # plain substring tests instead of the regex engine
+    mask = np.zeros(len(domains), dtype=bool)
+    for literal in literals:
+        mask |= domains.str.contains(literal, regex=False, na=False).to_numpy(dtype=bool)
+    return mask
+
+
 def regex_ignore_domains(df, pattern):
     if _is_valid_regex(pattern):
-        mask = df["domain"].str.contains(pattern, regex=True, na=False)
+        domains = df["domain"]
+        if isinstance(domains.dtype, pd.CategoricalDtype):
+            # match each distinct domain once, -1 (missing) codes pick the trailing False
+            category_mask = _domains_matching(pd.Series(domains.cat.categories), pattern)
+            mask = np.append(category_mask, False)[domains.cat.codes.to_numpy()]
+        else:
+            mask = _domains_matching(domains, pattern)
         return df[~mask].reset_index(drop=True)
     else:
         logging.warning(
@@ -44,8 +96,9 @@ def resolve_hostnames(df, hostname_map, display_mode="hostname", group_by_mac=Fa
     """
     logging.info(f"Resolving hostnames (Mode: {display_mode}, GroupByMAC: {group_by_mac})")
     
-    # Preserve original IP addresses
-    df["client_ip"] = df["client"]
+    # Preserve original IP addresses as codes into the distinct IPs, names are then looked up once per IP
+    ip_codes, ips = pd.factorize(df["client"], sort=True)
+    client_ip = pd.Categorical.from_codes(ip_codes, categories=ips)
     
     if group_by_mac and ip_to_mac and mac_to_name:
         logging.info("Grouping clients by MAC address...")
@@ -66,59 +119,103 @@ def resolve_hostnames(df, hostname_map, display_mode="hostname", group_by_mac=Fa
             if ip not in ip_to_display:
                 ip_to_display[ip] = hostname
                 
-        # Optimize: vectorized map is much faster than .apply()
-        df["client"] = df["client"].map(ip_to_display).fillna(df["client"])
+        display_map = ip_to_display
         
     elif display_mode == "ip":
         logging.info("Using raw IP addresses for client display")
         # No changes needed to 'client' column
+        display_map = None
     elif display_mode == "both":
-        # Create mapping: ip -> "Hostname (ip)"
-        both_map = {ip: f"{name} ({ip})" for ip, name in hostname_map.items()}
-        df["client"] = df["client"].map(both_map).fillna(df["client"])
+        # Create mapping: ip -> "Hostname (ip)", built only for the IPs present in the queries
+        display_map = {ip: f"{hostname_map[ip]} ({ip})" for ip in ips if ip in hostname_map}
     else:  # hostname mode
-        # Vectorized map
-        df["client"] = df["client"].map(hostname_map).fillna(df["client"])
-        
-    hostnames_resolved = df["client"].ne(df["client_ip"]).sum()
+        display_map = hostname_map
+
+    if display_map is None:
+        hostnames_resolved = 0
+        df["client"] = client_ip
+    else:
+        names = pd.Series(ips).map(display_map)
+        # count the resolved rows from the lookup itself, not by comparing to client_ip
+        rows_per_ip = np.bincount(ip_codes[ip_codes >= 0], minlength=len(ips))
+        hostnames_resolved = rows_per_ip[names.notna().to_numpy()].sum()
+        # several IPs can share a display name, so the names get their own codes
+        name_codes, display_names = pd.factorize(names.fillna(pd.Series(ips)), sort=True)
+        df["client"] = pd.Categorical.from_codes(
+            np.append(name_codes, -1)[ip_codes], categories=display_names
+        )
+    df["client_ip"] = client_ip
     logging.info(f"Resolved {hostnames_resolved} out of {len(df)} queries to unique device names")
     
     return df
 
 
+_TZ_CACHE = {}
+NS_PER_HOUR = 3_600_000_000_000
+NS_PER_DAY = 24 * NS_PER_HOUR
+
+
+def _get_timezone(timezone):
+    """Return the ZoneInfo for timezone, resolving each name only once"""
+    if timezone not in _TZ_CACHE:
+        _TZ_CACHE[timezone] = ZoneInfo(timezone)
+    return _TZ_CACHE[timezone]
+
+
+def _wall_clock_ns(timestamps):
+    """Local wall-clock time of tz-aware timestamps as int64 nanoseconds"""
+    return timestamps.dt.tz_localize(None).to_numpy().astype("datetime64[ns]").view("int64")
+
+
 def preprocess_df(df, timezone="UTC"):
     """Pre-process df to generate timestamps, blocked,allowed domains etc."""
 
     logging.info("Pre-processing dataframe...")
 
     try:
-        tz = ZoneInfo(timezone)  # noqa: F841
+        tz = _get_timezone(timezone)
     except Exception as e:
         logging.warning(f"Invalid timezone '{timezone}', falling back to UTC: {e}")
         timezone = "UTC"
+        tz = _get_timezone(timezone)
 
     logging.info(f"Selected timezone : {timezone}")
-    df = df.sort_values("timestamp").reset_index(drop=True)
-    df["timestamp"] = pd.to_datetime(df["timestamp"], unit="s", utc=True)
-    df["timestamp"] = df["timestamp"].dt.tz_convert(timezone)
-    df["date"] = df["timestamp"].dt.normalize()  # needed in group by operations
-    df["hour"] = df["timestamp"].dt.hour
-    df["day_period"] = df["hour"].apply(lambda h: "Day" if 6 <= h < 24 else "Night")
+    # rows usually come in insertion order which is already sorted by time
+    if not df["timestamp"].is_monotonic_increasing:
+        df = df.sort_values("timestamp", kind="stable").reset_index(drop=True)
+    if df["timestamp"].dtype.kind in "iu":
+        # integer epoch seconds (as stored by FTL) convert with a plain numpy cast
+        seconds = df["timestamp"].to_numpy(dtype=np.int64, copy=False).astype("datetime64[s]")
+        utc_times = pd.DatetimeIndex(seconds.astype("datetime64[ns]")).tz_localize("UTC")
+    else:
+        utc_times = pd.to_datetime(df["timestamp"].to_numpy(), unit="s", utc=True)
+    df["timestamp"] = utc_times.tz_convert(tz)
+    # calendar fields from the local wall clock, computed once instead of per dt accessor
+    wall_time = _wall_clock_ns(df["timestamp"])
+    days = wall_time // NS_PER_DAY
+    df["hour"] = (wall_time // NS_PER_HOUR % 24).astype(np.int8)
+    # days are sorted, so localize each distinct midnight once (same as dt.normalize())
+    unique_days, day_index = np.unique(days, return_inverse=True)
+    midnights = pd.DatetimeIndex((unique_days * NS_PER_DAY).view("datetime64[ns]")).tz_localize(tz)
+    df["date"] = midnights.take(day_index)  # needed in group by operations
+    # 6-23 is Day and 0-5 is Night, the comparison result is reused as the int8 codes without a copy
+    df["day_period"] = pd.Categorical.from_codes(
+        (df["hour"].to_numpy() < 6).view(np.int8), categories=["Day", "Night"]
+    )
     logging.info(
         f"Set timestamp, date, hour and day_period columns using timezone : {timezone}"
     )
 
-    # status ids for pihole ftl db, see pi-hole FTL docs
     logging.info("Processing allowed and blocked status codes...")
-    allowed_statuses = [2, 3, 12, 13, 14, 17]
-    blocked_statuses = [1, 4, 5, 6, 7, 8, 9, 10, 11, 15, 16, 18]
-    
-    # Vectorized optimization using boolean masking
-    df["status_type"] = "Other"
-    df.loc[df["status"].isin(allowed_statuses), "status_type"] = "Allowed"
-    df.loc[df["status"].isin(blocked_statuses), "status_type"] = "Blocked"
+    # status is an int8, viewed as uint8 every value is a valid index of the lookup table
+    df["status_type"] = pd.Categorical.from_codes(
+        STATUS_TYPE_CODES[df["status"].to_numpy().astype(np.uint8)], categories=STATUS_TYPES
+    )
 
-    df["day_name"] = df["timestamp"].dt.day_name()
+    # 1970-01-01 was a Thursday
+    df["day_name"] = pd.Categorical.from_codes(
+        ((days + 3) % 7).astype(np.int8), categories=DAY_NAMES, ordered=True
+    )
     df["reply_time"] = pd.to_numeric(df["reply_time"], errors="coerce")
     logging.info("Set status_type, day_name and reply_time columns.")
 
@@ -131,7 +228,8 @@ def process_dns_servers(df, forwarder_map, categorize_func):
     Args:
         df: DataFrame with 'forward' column containing forwarder IDs
         forwarder_map: Dictionary mapping forwarder IDs to DNS server addresses
-        categorize_func: Function to categorize DNS servers
+        categorize_func: Function categorizing a single DNS server (e.g. categorize_dns_server),
+            called once for each distinct server and with None for queries without one
     
     Returns:
         DataFrame with 'dns_server' and 'dns_category' columns
@@ -141,8 +239,14 @@ def process_dns_servers(df, forwarder_map, categorize_func):
     # Map forwarder IDs to DNS server addresses
     df["dns_server"] = df["forward"].map(forwarder_map)
     
-    # Categorize DNS servers for better grouping
-    df["dns_category"] = df["dns_server"].apply(categorize_func)
+    # Categorize each distinct DNS server once, the missing server (-1 code) is categorized last
+    server_codes, servers = pd.factorize(df["dns_server"])
+    servers = servers.to_numpy(dtype=object)
+    if (server_codes == -1).any():
+        servers = np.append(servers, None)
+    server_categories = np.array([categorize_func(server) for server in servers], dtype=object)
+    category_codes, categories = pd.factorize(server_categories, sort=True)
+    df["dns_category"] = pd.Categorical.from_codes(category_codes[server_codes], categories=categories)
     
     logging.info("DNS server information processed.")
     return df
@@ -183,48 +287,117 @@ def add_query_type_info(df):
     """
     logging.info("Adding query type information...")
     
-    df["query_type"] = df["type"].map(QUERY_TYPES).fillna("Other")
+    # a handful of names repeated over every row, look them up once per distinct type and store codes
+    type_codes, query_type_ids = pd.factorize(df["type"])
+    names = pd.Series(query_type_ids).map(QUERY_TYPES).fillna("Other")
+    name_codes, query_types = pd.factorize(names.to_numpy(dtype=object), sort=True)
+    df["query_type"] = pd.Categorical.from_codes(name_codes[type_codes], categories=query_types)
     
     # Add IPv4/IPv6 classification
-    df["ip_version"] = df["type"].apply(
-        lambda x: "IPv6" if x in [2, 28] else ("IPv4" if x == 1 else "Other")
+    query_type_ids = df["type"].to_numpy()
+    df["ip_version"] = pd.Categorical.from_codes(
+        np.select(
+            [query_type_ids == 1, (query_type_ids == 2) | (query_type_ids == 28)], [0, 1], default=2
+        ).astype(np.int8),
+        categories=["IPv4", "IPv6", "Other"],
     )
     
     logging.info("Query type information added.")
     return df
 
 
+def build_derived_columns(
+    df,
+    timezone,
+    hostname_map,
+    forwarder_map,
+    categorize_func,
+    display_mode="hostname",
+    group_by_mac=False,
+    ip_to_mac=None,
+    mac_to_name=None,
+):
+    """Add every derived column used by the stats, plots and callbacks
+    
+    Runs preprocess_df, resolve_hostnames, process_dns_servers and add_query_type_info
+    on the same frame. Each step reads only its own input columns, adds its columns in
+    place and looks strings up once per distinct value, so no intermediate frame is copied.
+    
+    Returns:
+        DataFrame with the timestamp, client, DNS server and query type columns derived
+    """
+    df = preprocess_df(df, timezone=timezone)
+    df = resolve_hostnames(
+        df,
+        hostname_map,
+        display_mode=display_mode,
+        group_by_mac=group_by_mac,
+        ip_to_mac=ip_to_mac,
+        mac_to_name=mac_to_name,
+    )
+    df = process_dns_servers(df, forwarder_map, categorize_func)
+    return add_query_type_info(df)
+
+
+def _hour_key(timestamps):
+    """Start of the local hour of tz-aware timestamps as int64 UTC nanoseconds
+
+    Unlike dt.floor("h") this does not fail on the hour repeated when DST ends.
+    """
+    utc_time = timestamps.to_numpy(dtype="datetime64[ns]").view("int64")
+    return utc_time - _wall_clock_ns(timestamps) % NS_PER_HOUR
+
+
 def prepare_hourly_aggregated_data(df, n_clients):
     """Pre-aggregate data by hour"""
     logging.info("Pre-aggregating data by hour for callbacks...")
 
-    # aggregate by hour, status_type, and client (which now contains display names)
-    hourly_agg = (
-        df.groupby([pd.Grouper(key="timestamp", freq="h"), "status_type", "client"])
+    # one groupby over all rows with every key, the three aggregations are then summed
+    # from this much smaller result instead of grouping (and binning) all rows three times
+    # hours are grouped as plain int64 keys and only the distinct hours are turned back into timestamps
+    keys = ["timestamp", "status_type", "dns_category", "query_type", "client"]
+    counts = (
+        df[keys[1:]]
+        .assign(timestamp=_hour_key(df["timestamp"]))
+        .groupby(keys, observed=True)
         .size()
-        .reset_index(name="count")
     )
+    hours = pd.DatetimeIndex(counts.index.levels[0].to_numpy().view("datetime64[ns]"))
+    counts.index = counts.index.set_levels(hours.tz_localize("UTC").tz_convert(df["timestamp"].dt.tz), level=0)
+
+    def hourly_counts(by):
+        return counts.groupby(level=["timestamp", by, "client"], observed=True).sum().reset_index(name="count")
+
+    # aggregate by hour, status_type, and client (which now contains display names)
+    hourly_agg = hourly_counts("status_type")
+
+    # every hour of the selected period, reused to fill missing hours in the callbacks
+    if hourly_agg.empty:
+        full_time_index = pd.DatetimeIndex([], tz=df["timestamp"].dt.tz, name="timestamp")
+    else:
+        full_time_index = pd.date_range(
+            hourly_agg["timestamp"].min(), hourly_agg["timestamp"].max(), freq="h", name="timestamp"
+        )
 
     # get top n_clients clients for client activity view
-    top_clients = df["client"].value_counts().nlargest(n_clients).index.tolist()
+    # count the category codes of client directly, codes are shifted by one so that
+    # missing clients (-1) land in a first bin that is dropped
+    client_codes = df["client"].cat.codes.to_numpy().astype(np.intp) + 1
+    client_counts = np.bincount(client_codes, minlength=len(df["client"].cat.categories) + 1)[1:]
+    # busiest first, ties in category order
+    top_codes = np.argsort(-client_counts, kind="stable")[:n_clients]
+    top_clients = df["client"].cat.categories[top_codes[client_counts[top_codes] > 0]].tolist()
 
     # aggregate by hour, dns_category, and client for Unbound trend
-    unbound_trend_agg = (
-        df.groupby([pd.Grouper(key="timestamp", freq="h"), "dns_category", "client"])
-        .size()
-        .reset_index(name="count")
-    )
+    unbound_trend_agg = hourly_counts("dns_category")
 
     # aggregate by hour, query_type, and client for adoption trend
-    query_type_trend_agg = (
-        df.groupby([pd.Grouper(key="timestamp", freq="h"), "query_type", "client"])
-        .size()
-        .reset_index(name="count")
-    )
+    query_type_trend_agg = hourly_counts("query_type")
 
     logging.info("Hourly aggregation complete")
     return {
         "hourly_agg": hourly_agg,
+        "full_time_index": full_time_index,
         "top_clients": top_clients,
         "unbound_trend_agg": unbound_trend_agg,
         "query_type_trend_agg": query_type_trend_agg,
@@ -3,7 +3,6 @@
 ## License :  MIT
 
 import logging
-import gc
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
@@ -55,11 +54,13 @@ def _top_clients_stats(stats, df):
     # top clients
     stats["top_client"] = df["client"].value_counts().idxmax() if not df.empty else "N/A"
     
+    # check .any() rather than .empty, value_counts on a categorical column
+    # also lists unused categories with a count of 0
     allowed_clients = df[df["status_type"] == "Allowed"]["client"].value_counts()
-    stats["top_allowed_client"] = allowed_clients.idxmax() if not allowed_clients.empty else "N/A"
+    stats["top_allowed_client"] = allowed_clients.idxmax() if allowed_clients.any() else "N/A"
 
     blocked_clients = df[df["status_type"] == "Blocked"]["client"].value_counts()
-    stats["top_blocked_client"] = blocked_clients.idxmax() if not blocked_clients.empty else "N/A"
+    stats["top_blocked_client"] = blocked_clients.idxmax() if blocked_clients.any() else "N/A"
     
     logging.info("Computed data for top clients.")
 
@@ -71,10 +72,10 @@ def _domain_stats(stats, df):
     Compute domain related stats
     """
     allowed_domains = df[df["status_type"] == "Allowed"]["domain"].value_counts()
-    stats["top_allowed_domain"] = allowed_domains.idxmax() if not allowed_domains.empty else "N/A"
+    stats["top_allowed_domain"] = allowed_domains.idxmax() if allowed_domains.any() else "N/A"
     
     blocked_domains = df[df["status_type"] == "Blocked"]["domain"].value_counts()
-    stats["top_blocked_domain"] = blocked_domains.idxmax() if not blocked_domains.empty else "N/A"
+    stats["top_blocked_domain"] = blocked_domains.idxmax() if blocked_domains.any() else "N/A"
     
     stats["top_allowed_domain_count"] = df[
         df["domain"] == stats["top_allowed_domain"]
@@ -88,13 +89,13 @@ def _domain_stats(stats, df):
         (df["status_type"] == "Allowed")
         & (df["domain"] == stats["top_allowed_domain"])
     ]["client"].value_counts()
-    stats["top_allowed_domain_client"] = allowed_domain_clients.idxmax() if not allowed_domain_clients.empty else "N/A"
+    stats["top_allowed_domain_client"] = allowed_domain_clients.idxmax() if allowed_domain_clients.any() else "N/A"
 
     blocked_domain_clients = df[
         (df["status_type"] == "Blocked")
         & (df["domain"] == stats["top_blocked_domain"])
     ]["client"].value_counts()
-    stats["top_blocked_domain_client"] = blocked_domain_clients.idxmax() if not blocked_domain_clients.empty else "N/A"
+    stats["top_blocked_domain_client"] = blocked_domain_clients.idxmax() if blocked_domain_clients.any() else "N/A"
     
     logging.info("Computed data for domains.")
 
@@ -107,7 +108,7 @@ def _most_persistent_stats(stats, df):
     """
     persistence = (
         (df[df["status_type"] == "Blocked"])
-        .groupby(["client", "domain"])
+        .groupby(["client", "domain"], observed=True)
         .size()
         .reset_index(name="count")
         .sort_values("count", ascending=False)
@@ -126,7 +127,6 @@ def _most_persistent_stats(stats, df):
     logging.info("Computed data for most persistent client.")
 
     del persistence
-    gc.collect()
 
     return stats
 
@@ -162,10 +162,10 @@ def _activity_stats(stats, df):
 
     # activity stats based on day
     daily_counts = (
-        df.groupby(["date", "day_name"]).size().reset_index(name="query_count")
+        df.groupby(["date", "day_name"], observed=True).size().reset_index(name="query_count")
     )
     avg = (
-        daily_counts.groupby("day_name")["query_count"].mean()
+        daily_counts.groupby("day_name", observed=True)["query_count"].mean()
         # .sort_values(ascending=False)
     )
     stats["most_active_day"] = avg.idxmax()
@@ -191,16 +191,16 @@ def _day_night_stats(stats, df):
         stats["day_top_client"] = day_df["client"].value_counts().idxmax()
         
         day_allowed = day_df[day_df["status_type"] == "Allowed"]["client"].value_counts()
-        stats["day_top_allowed_client"] = day_allowed.idxmax() if not day_allowed.empty else "N/A"
+        stats["day_top_allowed_client"] = day_allowed.idxmax() if day_allowed.any() else "N/A"
         
         day_blocked = day_df[day_df["status_type"] == "Blocked"]["client"].value_counts()
-        stats["day_top_blocked_client"] = day_blocked.idxmax() if not day_blocked.empty else "N/A"
+        stats["day_top_blocked_client"] = day_blocked.idxmax() if day_blocked.any() else "N/A"
         
         day_allowed_domains = day_df[day_df["status_type"] == "Allowed"]["domain"].value_counts()
-        stats["day_top_allowed_domain"] = day_allowed_domains.idxmax() if not day_allowed_domains.empty else "N/A"
+        stats["day_top_allowed_domain"] = day_allowed_domains.idxmax() if day_allowed_domains.any() else "N/A"
         
         day_blocked_domains = day_df[day_df["status_type"] == "Blocked"]["domain"].value_counts()
-        stats["day_top_blocked_domain"] = day_blocked_domains.idxmax() if not day_blocked_domains.empty else "N/A"
+        stats["day_top_blocked_domain"] = day_blocked_domains.idxmax() if day_blocked_domains.any() else "N/A"
         
         stats["day_top_allowed_domain_count"] = day_df[
             day_df["domain"] == stats["day_top_allowed_domain"]
@@ -215,7 +215,7 @@ def _day_night_stats(stats, df):
                 (day_df["status_type"] == "Allowed")
                 & (day_df["domain"] == stats["day_top_allowed_domain"])
             ]["client"].value_counts()
-            stats["day_top_allowed_domain_client"] = day_allowed_domain_clients.idxmax() if not day_allowed_domain_clients.empty else "N/A"
+            stats["day_top_allowed_domain_client"] = day_allowed_domain_clients.idxmax() if day_allowed_domain_clients.any() else "N/A"
         else:
             stats["day_top_allowed_domain_client"] = "N/A"
         
@@ -224,7 +224,7 @@ def _day_night_stats(stats, df):
                 (day_df["status_type"] == "Blocked")
                 & (day_df["domain"] == stats["day_top_blocked_domain"])
             ]["client"].value_counts()
-            stats["day_top_blocked_domain_client"] = day_blocked_domain_clients.idxmax() if not day_blocked_domain_clients.empty else "N/A"
+            stats["day_top_blocked_domain_client"] = day_blocked_domain_clients.idxmax() if day_blocked_domain_clients.any() else "N/A"
         else:
             stats["day_top_blocked_domain_client"] = "N/A"
     else:
@@ -245,16 +245,16 @@ def _day_night_stats(stats, df):
         stats["night_top_client"] = night_df["client"].value_counts().idxmax()
         
         night_allowed = night_df[night_df["status_type"] == "Allowed"]["client"].value_counts()
-        stats["night_top_allowed_client"] = night_allowed.idxmax() if not night_allowed.empty else "N/A"
+        stats["night_top_allowed_client"] = night_allowed.idxmax() if night_allowed.any() else "N/A"
         
         night_blocked = night_df[night_df["status_type"] == "Blocked"]["client"].value_counts()
-        stats["night_top_blocked_client"] = night_blocked.idxmax() if not night_blocked.empty else "N/A"
+        stats["night_top_blocked_client"] = night_blocked.idxmax() if night_blocked.any() else "N/A"
         
         night_allowed_domains = night_df[night_df["status_type"] == "Allowed"]["domain"].value_counts()
-        stats["night_top_allowed_domain"] = night_allowed_domains.idxmax() if not night_allowed_domains.empty else "N/A"
+        stats["night_top_allowed_domain"] = night_allowed_domains.idxmax() if night_allowed_domains.any() else "N/A"
         
         night_blocked_domains = night_df[night_df["status_type"] == "Blocked"]["domain"].value_counts()
-        stats["night_top_blocked_domain"] = night_blocked_domains.idxmax() if not night_blocked_domains.empty else "N/A"
+        stats["night_top_blocked_domain"] = night_blocked_domains.idxmax() if night_blocked_domains.any() else "N/A"
         
         stats["night_top_allowed_domain_count"] = night_df[
             night_df["domain"] == stats["night_top_allowed_domain"]
@@ -269,7 +269,7 @@ def _day_night_stats(stats, df):
                 (night_df["status_type"] == "Allowed")
                 & (night_df["domain"] == stats["night_top_allowed_domain"])
             ]["client"].value_counts()
-            stats["night_top_allowed_domain_client"] = night_allowed_domain_clients.idxmax() if not night_allowed_domain_clients.empty else "N/A"
+            stats["night_top_allowed_domain_client"] = night_allowed_domain_clients.idxmax() if night_allowed_domain_clients.any() else "N/A"
         else:
             stats["night_top_allowed_domain_client"] = "N/A"
         
@@ -278,7 +278,7 @@ def _day_night_stats(stats, df):
                 (night_df["status_type"] == "Blocked")
                 & (night_df["domain"] == stats["night_top_blocked_domain"])
             ]["client"].value_counts()
-            stats["night_top_blocked_domain_client"] = night_blocked_domain_clients.idxmax() if not night_blocked_domain_clients.empty else "N/A"
+            stats["night_top_blocked_domain_client"] = night_blocked_domain_clients.idxmax() if night_blocked_domain_clients.any() else "N/A"
         else:
             stats["night_top_blocked_domain_client"] = "N/A"
     else:
@@ -296,7 +296,6 @@ def _day_night_stats(stats, df):
     logging.info("Computed data for day and night stats.")
 
     del day_df, night_df
-    gc.collect()
 
     return stats
 
@@ -354,7 +353,6 @@ def _streak_stats(stats, df_sorted):
     logging.info("Computed data for streak stats.")
 
     del blocked_groups, allowed_groups, streaks_blocked, streaks_allowed
-    gc.collect()
 
     return stats
 
@@ -394,7 +392,6 @@ def _idle_time_stats(stats, df_sorted):
     logging.info("Computed data for time stats.")
 
     del allowed, blocked
-    gc.collect()
 
     return stats
 
@@ -406,7 +403,7 @@ def _unique_stats(stats, df):
     stats["unique_domains"] = df["domain"].nunique()
     stats["unique_clients"] = df["client"].nunique()
     diverse_client_df = (
-        df.groupby("client")["domain"].nunique().reset_index(name="unique_domains")
+        df.groupby("client", observed=True)["domain"].nunique().reset_index(name="unique_domains")
     )
     diverse_client_df = diverse_client_df.sort_values("unique_domains", ascending=False)
     
@@ -418,7 +415,6 @@ def _unique_stats(stats, df):
         stats["unique_domains_count"] = 0
 
     del diverse_client_df
-    gc.collect()
 
     return stats
 
@@ -431,7 +427,7 @@ def _reply_time_stats(stats, df):
     stats["max_reply_time"] = round(df["reply_time"].dropna().abs().max() * 1000, 3)
     stats["min_reply_time"] = round(df["reply_time"].dropna().abs().min() * 1000, 3)
 
-    avg_reply_times = df.groupby("domain")["reply_time"].mean().reset_index()
+    avg_reply_times = df.groupby("domain", observed=True)["reply_time"].mean().reset_index()
     avg_reply_times = avg_reply_times.sort_values("reply_time", ascending=False)
     
     if not avg_reply_times.empty:
@@ -639,6 +635,5 @@ def compute_stats(df, min_date_available, max_date_available, device_activity=No
     logging.info("All stats computed.")
     # release some memory
     del df_sorted
-    gc.collect()
 
     return stats
@@ -1,10 +1,40 @@
 import subprocess
 import logging
 import re
+import tempfile
+import threading
 
-def get_unbound_stats(command_prefix=["unbound-control"], server=None):
+# one "key=value" stat per line, almost all values are plain integers or decimals
+_STAT_LINE_RE = re.compile(rb"([^=]*)=(.*)")
+_NUMBER_RE = re.compile(rb"-?\d+(\.\d+)?")
+
+
+def _parse_stat_value(value):
+    """Convert a stat value to int or float if possible, otherwise keep it as a string"""
+    number = _NUMBER_RE.fullmatch(value)
+    if number:
+        return float(value) if number.group(1) else int(value)
+    try:
+        # less common formats, e.g. exponents
+        if b'.' in value:
+            return float(value)
+        return int(value)
+    except ValueError:
+        return value.decode(errors="replace")
+
+
+def _parse_stat_lines(lines):
+    """Yield (key, value) for every "key=value" line of raw unbound-control output"""
+    for line in lines:
+        match = _STAT_LINE_RE.match(line)
+        if match:
+            yield match.group(1).strip().decode(errors="replace"), _parse_stat_value(match.group(2).strip())
+
+
+def get_unbound_stats(command_prefix=["unbound-control"], server=None, timeout=10):
     """
     Executes 'unbound-control stats_noreset' and parses the output into a dictionary.
+    unbound-control is killed if it does not finish within timeout seconds.
     Returns a dictionary of stats or None if it fails.
     """
     try:
@@ -12,21 +42,31 @@ def get_unbound_stats(command_prefix=["unbound-control"], server=None):
         if server:
             cmd += ["-s", server]
         cmd += ["stats_noreset"]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        stats_output = result.stdout
-        
-        stats = {}
-        for line in stats_output.splitlines():
-            if '=' in line:
-                key, value = line.split('=', 1)
+        # parse the stats while they are written instead of buffering the whole output,
+        # as bytes since the output is plain ASCII. stderr goes to a file so that a lot of
+        # error output can not block unbound-control while stdout is read
+        with tempfile.TemporaryFile() as stderr_file:
+            with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file) as proc:
+                timed_out = threading.Event()
+
+                def kill():
+                    timed_out.set()
+                    proc.kill()
+
+                # killing unbound-control also ends the loop over its stdout
+                killer = threading.Timer(timeout, kill)
+                killer.start()
                 try:
-                    # Try to convert to float/int if possible
-                    if '.' in value:
-                        stats[key.strip()] = float(value.strip())
-                    else:
-                        stats[key.strip()] = int(value.strip())
-                except ValueError:
-                    stats[key.strip()] = value.strip()
+                    stats = dict(_parse_stat_lines(proc.stdout))
+                    proc.wait()
+                finally:
+                    killer.cancel()
+            if timed_out.is_set():
+                raise subprocess.TimeoutExpired(cmd, timeout)
+            stderr_file.seek(0)
+            stderr = stderr_file.read().decode(errors="replace")
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=stderr)
         
         # Calculate derived metrics
         total = stats.get("total.num.queries", 0)
@@ -41,9 +81,9 @@ def get_unbound_stats(command_prefix=["unbound-control"], server=None):
         # Format uptime if available
         uptime = stats.get("time.up", 0)
         if uptime:
-            days = int(uptime // 86400)
-            hours = int((uptime % 86400) // 3600)
-            minutes = int((uptime % 3600) // 60)
+            days, seconds = divmod(int(uptime), 86400)
+            hours, seconds = divmod(seconds, 3600)
+            minutes = seconds // 60
             if days > 0:
                 stats["uptime_str"] = f"{days}d {hours}h {minutes}m"
             else:
@@ -56,6 +96,9 @@ def get_unbound_stats(command_prefix=["unbound-control"], server=None):
     except FileNotFoundError:
         logging.warning("unbound-control command not found. Skipping Unbound real-time stats.")
         return None
+    except subprocess.TimeoutExpired:
+        logging.warning(f"unbound-control did not respond within {timeout} seconds. Skipping Unbound real-time stats.")
+        return None
     except subprocess.CalledProcessError as e:
         stderr_msg = e.stderr.strip() if e.stderr else "No error message"
         logging.warning(f"Error calling unbound-control: {stderr_msg} (Exit code: {e.returncode}). Skipping Unbound real-time stats.")
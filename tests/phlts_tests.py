@@ -7,12 +7,17 @@ from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 import tempfile
 import shutil
+import sys
+import logging
 import pandas.testing as pdt
 
 import piholelongtermstats
 print("piholelongtermstats dir : ",piholelongtermstats.__file__)
-from piholelongtermstats.db import connect_to_sql,read_pihole_ftl_db,probe_sample_df,get_timestamp_range
-from piholelongtermstats.process import _is_valid_regex,regex_ignore_domains
+from piholelongtermstats.db import connect_to_sql,read_pihole_ftl_db,probe_sample_df,get_timestamp_range,concat_chunks
+from piholelongtermstats.db import categorize_dns_server,categorize_dns_server_vec,read_pihole_ftl_aggregates
+from piholelongtermstats.db import load_hostname_mapping,load_client_mac_mapping,load_forwarder_mapping,load_device_activity,load_all_mappings,clear_mappings_cache
+from piholelongtermstats.process import _is_valid_regex,regex_ignore_domains,prepare_hourly_aggregated_data,resolve_hostnames,add_query_type_info,process_dns_servers
+from piholelongtermstats.unbound_stats import get_unbound_stats
 
 @pytest.fixture(scope="session")
 def dummy_df():
@@ -87,6 +92,71 @@ def dummy_df():
     shutil.rmtree(temp_dir)
 
 
+@pytest.fixture(scope="session")
+def dummy_network_db():
+    temp_dir = tempfile.mkdtemp()
+    out = Path(temp_dir) / "test_network.db"
+
+    conn = sqlite3.connect(out)
+    conn.executescript(
+        """
+        CREATE TABLE network (id INTEGER PRIMARY KEY, hwaddr TEXT, macVendor TEXT,
+            firstSeen INTEGER, lastQuery INTEGER, numQueries INTEGER);
+        CREATE TABLE network_addresses (network_id INTEGER, ip TEXT, name TEXT);
+        CREATE TABLE forward_by_id (id INTEGER PRIMARY KEY, forward TEXT);
+
+        INSERT INTO network VALUES (1, 'AA:BB:CC:00:00:01', 'Apple', 1700000000, 1700003600, 120);
+        INSERT INTO network VALUES (2, 'aa:bb:cc:00:00:02', NULL, 0, NULL, 5);
+        INSERT INTO network VALUES (3, '', 'Ignored', 1700000000, 1700000000, 1);
+
+        INSERT INTO network_addresses VALUES (1, '192.168.1.2', 'apple-tv');
+        INSERT INTO network_addresses VALUES (1, 'fe80::1', 'Apple-TV');
+        INSERT INTO network_addresses VALUES (1, '192.168.1.9', 'Living-Room');
+        INSERT INTO network_addresses VALUES (2, '192.168.1.3', 'laptop');
+        INSERT INTO network_addresses VALUES (2, '192.168.1.4', '');
+
+        INSERT INTO forward_by_id VALUES (1, '127.0.0.1#5335');
+        INSERT INTO forward_by_id VALUES (2, '::1#5335');
+        """
+    )
+    conn.close()
+
+    yield str(out)
+
+    shutil.rmtree(temp_dir)
+
+
+@pytest.fixture
+def dummy_storage_db(tmp_path):
+    """Small database with the query_storage schema of recent FTL versions"""
+    db = tmp_path / "test_ftl_storage.db"
+    conn = sqlite3.connect(db)
+    conn.executescript(
+        """
+        CREATE TABLE query_storage (id INTEGER PRIMARY KEY, timestamp INTEGER, type INTEGER,
+            status INTEGER, domain INTEGER, client INTEGER, forward INTEGER, reply_time REAL);
+        CREATE TABLE client_by_id (id INTEGER PRIMARY KEY, ip TEXT);
+        CREATE TABLE domain_by_id (id INTEGER PRIMARY KEY, domain TEXT);
+        CREATE TABLE forward_by_id (id INTEGER PRIMARY KEY, forward TEXT);
+
+        INSERT INTO client_by_id VALUES (1, '192.168.1.2'), (2, '192.168.1.3');
+        INSERT INTO domain_by_id VALUES (1, 'allowed.com'), (2, 'blocked.com'), (3, 'other.com');
+        INSERT INTO forward_by_id VALUES (1, '127.0.0.1#5335');
+
+        -- 2024-01-01 (Monday) 23:30 UTC is 2024-01-02 (Tuesday) 05:00 in Asia/Kolkata
+        INSERT INTO query_storage VALUES (1, 1704151800, 1, 2, 1, 1, 1, 0.1);
+        INSERT INTO query_storage VALUES (2, 1704151800, 1, 2, 1, 2, 1, 0.1);
+        INSERT INTO query_storage VALUES (3, 1704151900, 1, 1, 2, 1, NULL, 0.1);
+        INSERT INTO query_storage VALUES (4, 1704151900, 1, 0, 3, 1, NULL, 0.1);
+        -- outside of the date range
+        INSERT INTO query_storage VALUES (5, 1700000000, 1, 2, 1, 2, 1, 0.1);
+        """
+    )
+    conn.close()
+
+    return str(db)
+
+
 def test_connect_existing_database(dummy_df):
     """Test connection to valid db path"""
     db1, _, _, _ = dummy_df
@@ -101,6 +171,15 @@ def test_connect_to_nonexistent_db():
         connect_to_sql("123non_existent_ftl123.db")
 
 
+def test_connect_is_read_only(dummy_df):
+    """Connections are opened with PRAGMA query_only"""
+    db1, _, _, _ = dummy_df
+    conn = connect_to_sql(db1)
+    with pytest.raises(sqlite3.OperationalError):
+        conn.execute("CREATE TABLE should_not_exist (x INTEGER)")
+    conn.close()
+
+
 def test_probe_sample_df(dummy_df):
     db1, _, df1, _ = dummy_df
     conn = connect_to_sql(db1)
@@ -234,6 +313,223 @@ def test_read_pihole_ftl_db_with_date_range(dummy_df):
     pdt.assert_frame_equal(df, df1_mod, check_dtype=False, check_like=True)
 
 
+def test_read_pihole_ftl_aggregates(dummy_storage_db):
+    """Counts done in SQL match counting the query rows"""
+    agg = read_pihole_ftl_aggregates(
+        [dummy_storage_db], start_date="2024-01-02", end_date="2024-01-02", timezone="Asia/Kolkata"
+    )
+
+    assert agg["top_clients"].to_dict("list") == {"client": ["192.168.1.2", "192.168.1.3"], "count": [3, 1]}
+    assert agg["top_allowed_domains"].to_dict("list") == {"domain": ["allowed.com"], "count": [2]}
+    assert agg["top_blocked_domains"].to_dict("list") == {"domain": ["blocked.com"], "count": [1]}
+    assert agg["day_hour_counts"].loc[("Tuesday", 5)].to_dict() == {"Allowed": 2, "Blocked": 1, "Other": 1}
+    assert agg["dns_categories"].to_dict() == {"Unbound IPv4": 2, "Cached/Blocked": 2}
+
+
+def test_read_pihole_ftl_aggregates_multiple_databases(dummy_storage_db, tmp_path, caplog):
+    """Forwarder ids are mapped within each database, REAL timestamps are bucketed"""
+    second_db = tmp_path / "second_ftl_storage.db"
+    shutil.copy(dummy_storage_db, second_db)
+    conn = sqlite3.connect(second_db)
+    # forwarder id 1 is a different server in this database
+    conn.execute("UPDATE forward_by_id SET forward = '8.8.8.8#53' WHERE id = 1")
+    conn.execute("UPDATE query_storage SET timestamp = timestamp + 0.5")
+    conn.execute("INSERT INTO query_storage VALUES (6, 1704151850.25, 1, 2, 1, 1, 1, 0.1)")
+    conn.commit()
+    conn.close()
+
+    with caplog.at_level(logging.INFO):
+        agg = read_pihole_ftl_aggregates(
+            [dummy_storage_db, str(second_db)], start_date="2024-01-02", end_date="2024-01-02", timezone="Asia/Kolkata"
+        )
+
+    assert agg["dns_categories"].to_dict() == {"Cached/Blocked": 4, "8.8.8.8#53": 3, "Unbound IPv4": 2}
+    assert agg["day_hour_counts"].loc[("Tuesday", 5)].to_dict() == {"Allowed": 5, "Blocked": 2, "Other": 2}
+    assert agg["top_clients"].to_dict("list") == {"client": ["192.168.1.2", "192.168.1.3"], "count": [7, 2]}
+    # one 15 minute bucket per status and database, not one per distinct timestamp
+    assert "Aggregated 9 queries into 6 time buckets." in caplog.text
+
+
+def test_read_pihole_ftl_db_decodes_invalid_utf8(dummy_storage_db):
+    """Invalid UTF-8 in text columns is replaced instead of failing the whole query"""
+    conn = sqlite3.connect(dummy_storage_db)
+    conn.execute("INSERT INTO domain_by_id VALUES (4, CAST(x'ff6578616d706c652e636f6d' AS TEXT))")
+    conn.execute("INSERT INTO query_storage VALUES (6, 1704151900, 1, 2, 4, 2, NULL, 0.1)")
+    conn.commit()
+    conn.close()
+
+    df = concat_chunks(
+        read_pihole_ftl_db(
+            [dummy_storage_db], start_date="2024-01-01", end_date="2024-01-02", chunksize=[2]
+        )
+    )
+
+    assert df.loc[df["id"] == 6, "domain"].tolist() == ["\ufffdexample.com"]
+    assert df["domain"].dtype == "category"
+    assert df["client"].tolist() == ["192.168.1.2", "192.168.1.3", "192.168.1.2", "192.168.1.2", "192.168.1.3"]
+
+
+def test_fetch_query_chunks_keeps_text_factory(dummy_storage_db):
+    """A paused or abandoned chunk generator does not leave the connection returning bytes"""
+    conn = connect_to_sql(dummy_storage_db)
+    chunks = piholelongtermstats.db._fetch_query_chunks(conn, piholelongtermstats.db.QUERY_COLUMNS, (), 2)
+
+    assert next(chunks)["domain"].tolist() == ["allowed.com", "allowed.com"]
+    assert conn.execute("SELECT domain FROM domain_by_id WHERE id = 1").fetchone()[0] == "allowed.com"
+    assert len(next(chunks)) == 2
+    conn.close()
+
+
+def test_read_pihole_ftl_db_keeps_large_query_types(dummy_storage_db):
+    """Query type ids above 127 are read as they are, not wrapped around"""
+    conn = sqlite3.connect(dummy_storage_db)
+    conn.execute("INSERT INTO query_storage VALUES (6, 1704151900, 257, 2, 1, 2, NULL, 0.1)")
+    conn.execute("INSERT INTO query_storage VALUES (7, 1704151900, 357, 2, 1, 2, NULL, 0.1)")
+    conn.commit()
+    conn.close()
+
+    df = concat_chunks(
+        read_pihole_ftl_db(
+            [dummy_storage_db], start_date="2024-01-01", end_date="2024-01-02", chunksize=[2]
+        )
+    )
+    df = add_query_type_info(df)
+
+    assert df.loc[df["id"] >= 6, "type"].tolist() == [257, 357]
+    assert df.loc[df["id"] >= 6, "query_type"].tolist() == ["CAA", "Other"]
+
+
+def test_read_pihole_ftl_db_out_of_range_values(dummy_storage_db):
+    """Values that do not fit the compact dtypes are kept in a wider dtype instead of failing"""
+    conn = sqlite3.connect(dummy_storage_db)
+    conn.execute("INSERT INTO query_storage VALUES (3000000000, 1704151900, 40000, 2, 1, 2, NULL, 0.1)")
+    conn.commit()
+    conn.close()
+
+    df = concat_chunks(
+        read_pihole_ftl_db(
+            [dummy_storage_db], start_date="2024-01-01", end_date="2024-01-02", chunksize=[2]
+        )
+    )
+
+    assert df["id"].tolist() == [1, 2, 3, 4, 3000000000]
+    assert df["type"].tolist() == [1, 1, 1, 1, 40000]
+    assert df["forward"].tolist() == [1, 1, pd.NA, pd.NA, pd.NA]
+    assert df["status"].dtype == "int8"
+
+
+def test_read_pihole_ftl_db_parquet_cache(dummy_storage_db, tmp_path):
+    """Rows read from the parquet cache match the rows read from the database"""
+    pytest.importorskip("pyarrow")
+    kwargs = dict(start_date="2024-01-01", end_date="2024-01-02", chunksize=[2], timezone="UTC")
+    cache_dir = tmp_path / "cache"
+
+    from_db = concat_chunks(read_pihole_ftl_db([dummy_storage_db], **kwargs))
+    for _ in range(2):  # write the cache, then read it
+        chunks = list(read_pihole_ftl_db([dummy_storage_db], cache_dir=str(cache_dir), **kwargs))
+        assert len(list(cache_dir.glob("*.parquet"))) == 1
+        # the chunksize limit applies to the cache too
+        assert max(len(chunk) for chunk in chunks) == 2
+        pdt.assert_frame_equal(concat_chunks(chunks), from_db, check_categorical=False)
+
+    kwargs.update(start_date="2023-01-01", end_date="2023-01-02")
+    empty = concat_chunks(read_pihole_ftl_db([dummy_storage_db], cache_dir=str(cache_dir), **kwargs))
+    assert empty.empty
+    assert empty.dtypes.astype(str).to_dict() == from_db.dtypes.astype(str).to_dict()
+
+
+def test_read_pihole_ftl_db_parquet_cache_float_timestamps(dummy_storage_db, tmp_path):
+    """Databases with REAL timestamps are cached with float timestamps"""
+    pytest.importorskip("pyarrow")
+    conn = sqlite3.connect(dummy_storage_db)
+    conn.execute("UPDATE query_storage SET timestamp = timestamp + 0.5 WHERE id = 3")
+    conn.commit()
+    conn.close()
+    kwargs = dict(start_date="2024-01-01", end_date="2024-01-02", chunksize=[2], timezone="UTC")
+    cache_dir = tmp_path / "cache"
+
+    from_db = concat_chunks(read_pihole_ftl_db([dummy_storage_db], **kwargs))
+    from_cache = concat_chunks(read_pihole_ftl_db([dummy_storage_db], cache_dir=str(cache_dir), **kwargs))
+    # the cache is written in timestamp order
+    from_cache = from_cache.sort_values("id", ignore_index=True)
+
+    assert len(list(cache_dir.glob("*.parquet"))) == 1
+    assert from_cache["timestamp"].tolist() == [1704151800, 1704151800, 1704151900.5, 1704151900]
+    pdt.assert_frame_equal(from_cache, from_db, check_categorical=False)
+
+
+def test_read_pihole_ftl_db_parquet_cache_failure_not_retried(dummy_storage_db, tmp_path, monkeypatch):
+    """A cache that could not be written is not rebuilt on every read of an unchanged database"""
+    pytest.importorskip("pyarrow")
+    conn = sqlite3.connect(dummy_storage_db)
+    # does not fit the int16 type column of the cache
+    conn.execute("INSERT INTO query_storage VALUES (6, 1704151900, 40000, 2, 1, 2, NULL, 0.1)")
+    conn.commit()
+    conn.close()
+    kwargs = dict(start_date="2024-01-01", end_date="2024-01-02", chunksize=[2], timezone="UTC")
+    cache_dir = tmp_path / "cache"
+
+    calls = []
+    write_parquet_cache = piholelongtermstats.db._write_parquet_cache
+    monkeypatch.setattr(
+        piholelongtermstats.db,
+        "_write_parquet_cache",
+        lambda *args: calls.append(args) or write_parquet_cache(*args),
+    )
+
+    from_db = concat_chunks(read_pihole_ftl_db([dummy_storage_db], **kwargs))
+    for _ in range(2):
+        from_cache = concat_chunks(read_pihole_ftl_db([dummy_storage_db], cache_dir=str(cache_dir), **kwargs))
+        pdt.assert_frame_equal(from_cache, from_db)
+    assert len(calls) == 1
+    assert list(cache_dir.glob("*.parquet")) == []
+
+
+def test_concat_chunks_keeps_categoricals():
+    chunks = [
+        pd.DataFrame({"id": [1, 2], "domain": pd.Categorical(["b.com", "a.com"])}),
+        pd.DataFrame({"id": [3], "domain": pd.Categorical(["c.com"])}),
+    ]
+    df = concat_chunks(chunks)
+    assert list(df.columns) == ["id", "domain"]
+    assert isinstance(df["domain"].dtype, pd.CategoricalDtype)
+    assert df["domain"].tolist() == ["b.com", "a.com", "c.com"]
+    assert df["id"].tolist() == [1, 2, 3]
+
+
+def _server_address(server):
+    """Categorize function handling a single server only"""
+    return "Cached/Blocked" if server is None else server.split("#")[0]
+
+
+@pytest.mark.parametrize(
+    "categorize_func, expected",
+    [
+        (categorize_dns_server, ["Unbound IPv4", "8.8.8.8#53", "Cached/Blocked", "Router", "Unbound IPv4"]),
+        (_server_address, ["127.0.0.1", "8.8.8.8", "Cached/Blocked", "192.168.50.1", "127.0.0.1"]),
+        (lambda server: "Cached" if server is None else server, ["127.0.0.1#5335", "8.8.8.8#53", "Cached", "192.168.50.1#53", "127.0.0.1#5335"]),
+    ],
+)
+def test_process_dns_servers(categorize_func, expected):
+    """categorize_func is called for every distinct server, and with None for missing ones"""
+    forwarder_map = {1: "127.0.0.1#5335", 2: "8.8.8.8#53", 3: "192.168.50.1#53"}
+    df = pd.DataFrame({"forward": pd.array([1, 2, None, 3, 1], dtype="Int32")})
+
+    df = process_dns_servers(df, forwarder_map, categorize_func)
+
+    assert df["dns_category"].tolist() == expected
+
+
+def test_categorize_dns_server_vec():
+    servers = pd.Series(
+        ["127.0.0.1#5335", "::1#5335", "192.168.50.1#53", "fe80::ce28:aaff:fe29:f650#53", "8.8.8.8#53", None, np.nan]
+    )
+    expected = [categorize_dns_server(s) for s in servers]
+    result = categorize_dns_server_vec(servers)
+    assert isinstance(result.dtype, pd.CategoricalDtype)
+    assert result.tolist() == expected
+
+
 def test_is_valid_regex():
     assert _is_valid_regex("*test") is False
     assert _is_valid_regex(".*\.local") is True
@@ -249,3 +545,184 @@ def test_regex_ignore_domains(dummy_df):
 
     pdt.assert_frame_equal(df1, df_test1, check_dtype=False, check_like=True)
     pdt.assert_frame_equal(df1_expected, df_test2, check_dtype=False, check_like=True)
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    [
+        "example", "blocked", "^ads", "ad.?s", "tracker|example", "(?i)EXAMPLE", "b+locked",
+        r"ads\.example\.com", r"tracker\.net|blocked", "example.com|as", "tracker|", "a(?:s|d)",
+        r"\@example", r"ads\\", r"a\|b", r"\d",
+    ],
+)
+def test_regex_ignore_domains_matches_str_contains(pattern):
+    domains = ["example.com", "ads.example.com", "tracker.net", "blocked.org", "bblocked.dev", "as.com", None]
+    df = pd.DataFrame({"domain": domains, "id": range(len(domains))})
+    expected = df[~df["domain"].str.contains(pattern, regex=True, na=False)].reset_index(drop=True)
+
+    pdt.assert_frame_equal(regex_ignore_domains(df, pattern), expected)
+    df["domain"] = df["domain"].astype("category")
+    result = regex_ignore_domains(df, pattern)
+    pdt.assert_series_equal(result["id"], expected["id"])
+
+
+@pytest.mark.parametrize(
+    "display_mode, expected",
+    [
+        ("hostname", ["alpha", "beta", "alpha", "10.0.0.4", None, "alpha"]),
+        ("ip", ["10.0.0.1", "10.0.0.2", "10.0.0.3", "10.0.0.4", None, "10.0.0.1"]),
+        ("both", ["alpha (10.0.0.1)", "beta (10.0.0.2)", "alpha (10.0.0.3)", "10.0.0.4", None, "alpha (10.0.0.1)"]),
+    ],
+)
+def test_resolve_hostnames(display_mode, expected):
+    clients = ["10.0.0.1", "10.0.0.2", "10.0.0.3", "10.0.0.4", None, "10.0.0.1"]
+    hostname_map = {"10.0.0.1": "alpha", "10.0.0.2": "beta", "10.0.0.3": "alpha"}
+    df = resolve_hostnames(pd.DataFrame({"client": clients}), hostname_map, display_mode=display_mode)
+
+    assert df["client"].dtype == "category"
+    assert df["client"].astype(object).where(df["client"].notna(), None).tolist() == expected
+    assert df["client_ip"].astype(object).where(df["client_ip"].notna(), None).tolist() == clients
+
+
+def test_load_hostname_mapping(dummy_network_db):
+    hostname_map = load_hostname_mapping(dummy_network_db)
+    assert hostname_map == {
+        "192.168.1.2": "apple-tv",
+        "fe80::1": "Apple-TV",
+        "192.168.1.9": "Living-Room",
+        "192.168.1.3": "laptop",
+    }
+
+
+def test_load_client_mac_mapping(dummy_network_db):
+    ip_to_mac, mac_to_name = load_client_mac_mapping(dummy_network_db)
+    assert ip_to_mac == {
+        "192.168.1.2": "aa:bb:cc:00:00:01",
+        "fe80::1": "aa:bb:cc:00:00:01",
+        "192.168.1.9": "aa:bb:cc:00:00:01",
+        "192.168.1.3": "aa:bb:cc:00:00:02",
+        "192.168.1.4": "aa:bb:cc:00:00:02",
+    }
+    # first capitalised name wins over an earlier lowercase one
+    assert mac_to_name == {
+        "aa:bb:cc:00:00:01": "Apple-TV",
+        "aa:bb:cc:00:00:02": "laptop",
+    }
+
+
+def test_load_client_mac_mapping_across_batches(dummy_network_db, monkeypatch):
+    monkeypatch.setattr(piholelongtermstats.db, "MAPPING_FETCH_SIZE", 1)
+    _, mac_to_name = load_client_mac_mapping(dummy_network_db)
+    assert mac_to_name == {
+        "aa:bb:cc:00:00:01": "Apple-TV",
+        "aa:bb:cc:00:00:02": "laptop",
+    }
+    assert len(load_device_activity(dummy_network_db)) == 2
+
+
+def test_load_forwarder_mapping(dummy_network_db):
+    assert load_forwarder_mapping(dummy_network_db) == {
+        1: "127.0.0.1#5335",
+        2: "::1#5335",
+    }
+
+
+def test_load_device_activity(dummy_network_db):
+    device_activity = load_device_activity(dummy_network_db)
+    assert set(device_activity) == {"aa:bb:cc:00:00:01", "aa:bb:cc:00:00:02"}
+
+    apple = device_activity["aa:bb:cc:00:00:01"]
+    assert apple["first_seen"] == datetime.fromtimestamp(1700000000, tz=ZoneInfo("UTC"))
+    assert apple["last_query"] == datetime.fromtimestamp(1700003600, tz=ZoneInfo("UTC"))
+    assert apple["lifetime_queries"] == 120
+    assert apple["vendor"] == "Apple"
+
+    unknown = device_activity["aa:bb:cc:00:00:02"]
+    assert unknown["first_seen"] is None
+    assert unknown["last_query"] is None
+    assert unknown["vendor"] == "Unknown"
+
+
+def test_load_all_mappings(dummy_network_db):
+    mappings = load_all_mappings(dummy_network_db)
+    ip_to_mac, mac_to_name = load_client_mac_mapping(dummy_network_db)
+    assert mappings["hostname_map"] == load_hostname_mapping(dummy_network_db)
+    assert mappings["ip_to_mac"] == ip_to_mac
+    assert mappings["mac_to_name"] == mac_to_name
+    assert mappings["forwarder_map"] == load_forwarder_mapping(dummy_network_db)
+    assert mappings["device_activity"] == load_device_activity(dummy_network_db)
+
+
+def test_load_all_mappings_is_cached(dummy_network_db, monkeypatch):
+    """The database is only read again after clear_mappings_cache"""
+    import piholelongtermstats.db as db
+
+    clear_mappings_cache()
+    calls = []
+    original = db._load_hostname_mapping
+    monkeypatch.setattr(db, "_load_hostname_mapping", lambda conn: calls.append(1) or original(conn))
+
+    first = load_all_mappings(dummy_network_db)
+    assert load_all_mappings(dummy_network_db) == first
+    assert len(calls) == 1
+
+    clear_mappings_cache()
+    assert load_all_mappings(dummy_network_db) == first
+    assert len(calls) == 2
+
+
+def test_prepare_hourly_aggregated_data_dst():
+    """Hourly buckets match pd.Grouper, also for the hour repeated when DST ends"""
+    # 01:30 EDT, 01:30 EST, 01:45 EST and 02:30 EST on 2024-11-03 in New York
+    timestamps = pd.to_datetime(
+        [1730611800, 1730615400, 1730616300, 1730619000], unit="s", utc=True
+    ).tz_convert("America/New_York")
+    df = pd.DataFrame(
+        {
+            "timestamp": timestamps,
+            "status_type": pd.Categorical(["Allowed", "Blocked", "Blocked", "Allowed"]),
+            "dns_category": pd.Categorical(["Router"] * 4),
+            "query_type": pd.Categorical(["A (IPv4)"] * 4),
+            "client": pd.Categorical(["a", "a", "a", "b"]),
+        }
+    )
+
+    hourly = prepare_hourly_aggregated_data(df, n_clients=2)
+
+    expected = (
+        df.groupby([pd.Grouper(key="timestamp", freq="h"), "status_type", "client"], observed=True)
+        .size()
+        .reset_index(name="count")
+    )
+    pdt.assert_frame_equal(hourly["hourly_agg"], expected, check_categorical=False)
+    assert len(hourly["full_time_index"]) == 3
+    assert hourly["top_clients"] == ["a", "b"]
+
+
+def test_get_unbound_stats():
+    output = "total.num.queries=200\ntotal.num.cachehits=150\ntime.up=93784.500000\nnum.answer.rcode.NOERROR=abc\n"
+    # the command gets "stats_noreset" appended, which the script ignores
+    stats = get_unbound_stats(command_prefix=[sys.executable, "-c", f"print({output!r}, end='')"])
+
+    assert stats["total.num.queries"] == 200
+    assert stats["time.up"] == 93784.5
+    assert stats["num.answer.rcode.NOERROR"] == "abc"
+    assert stats["cache_hit_rate"] == 75.0
+    assert stats["uptime_str"] == "1d 2h 3m"
+
+    failing = [sys.executable, "-c", "import sys; sys.exit('error: no server')"]
+    assert get_unbound_stats(command_prefix=failing) is None
+
+
+def test_get_unbound_stats_large_stderr():
+    """A lot of output on stderr does not block reading the stats"""
+    script = "import sys; sys.stderr.write('x' * 200_000); print('total.num.queries=5')"
+    stats = get_unbound_stats(command_prefix=[sys.executable, "-c", script], timeout=30)
+
+    assert stats["total.num.queries"] == 5
+
+
+def test_get_unbound_stats_timeout():
+    """unbound-control is killed when it does not respond in time"""
+    script = "import time; print('total.num.queries=5', flush=True); time.sleep(30)"
+    assert get_unbound_stats(command_prefix=[sys.executable, "-c", script], timeout=0.5) is None